@@ -0,0 +1,450 @@
+# Offline search benchmark: synthetic catalog + query replay, bina Telegram/Mongo/TMDB ke
+#   python bench.py                          # 1k/10k/100k catalogs, results bench_results/<label>.json me
+#   python bench.py --sizes 10000 --baseline bench_results/old.json
+import os
+
+# main.py config import time par padhta hai; TMDB stub ke liye key set honi chahiye
+os.environ.setdefault("TMDB_API_KEY", "bench")
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+
+import main
+
+BENCH_DIR = "bench_results"
+BOT_USERNAME = "BenchBot"
+
+# ================= IN-MEMORY MONGO STAND-IN =================
+# Sirf utna Motor API jitna search/ingest/job-queue path use karta hai
+COMPARATORS = {
+    "$lt": lambda a, b: a is not None and a < b,
+    "$lte": lambda a, b: a is not None and a <= b,
+    "$gt": lambda a, b: a is not None and a > b,
+    "$gte": lambda a, b: a is not None and a >= b,
+}
+
+def doc_matches(doc, spec):
+    for key, cond in spec.items():
+        if key == "$or":
+            if not any(doc_matches(doc, sub) for sub in cond):
+                return False
+            continue
+        value = doc.get(key)
+        if isinstance(cond, dict):
+            if "$in" in cond and value not in cond["$in"]:
+                return False
+            if "$nin" in cond and value in cond["$nin"]:
+                return False
+            if "$exists" in cond and (key in doc) != cond["$exists"]:
+                return False
+            if any(op in cond and not fn(value, cond[op]) for op, fn in COMPARATORS.items()):
+                return False
+        elif value != cond:
+            return False
+    return True
+
+def apply_update(doc, update, inserted=False):
+    doc.update(update.get("$set", {}))
+    if inserted:
+        doc.update(update.get("$setOnInsert", {}))
+    for key, amount in update.get("$inc", {}).items():
+        doc[key] = doc.get(key, 0) + amount
+    for key in update.get("$unset", {}):
+        doc.pop(key, None)
+
+class MemoryCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, *args, **kwargs):
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    async def to_list(self, length=None):
+        return self.docs[:length] if length else list(self.docs)
+
+    def __aiter__(self):
+        return self.iterate()
+
+    async def iterate(self):
+        for doc in self.docs:
+            yield doc
+
+class MemoryCollection:
+    def __init__(self, name, docs=()):
+        self.name = name
+        self.docs = {}
+        for doc in docs:
+            self.docs[doc["_id"]] = doc
+
+    def find(self, spec=None, projection=None):
+        return MemoryCursor([doc for doc in self.docs.values() if doc_matches(doc, spec or {})])
+
+    async def find_one(self, spec=None, projection=None):
+        return next((doc for doc in self.docs.values() if doc_matches(doc, spec or {})), None)
+
+    async def distinct(self, key, spec=None):
+        return list({doc[key] for doc in self.docs.values() if key in doc and doc_matches(doc, spec or {})})
+
+    async def insert_one(self, doc):
+        await self.insert_many([doc])
+
+    async def insert_many(self, docs, ordered=True):
+        for doc in docs:
+            doc.setdefault("_id", main.ObjectId())
+            self.docs[doc["_id"]] = doc
+
+    async def update_one(self, spec, update, upsert=False):
+        doc = await self.find_one(spec)
+        inserted = doc is None
+        if inserted:
+            if not upsert:
+                return
+            doc = {k: v for k, v in spec.items() if not k.startswith("$") and not isinstance(v, dict)}
+            doc.setdefault("_id", main.ObjectId())
+            if doc["_id"] in self.docs:
+                raise main.DuplicateKeyError(f"duplicate key: {doc['_id']}")
+            self.docs[doc["_id"]] = doc
+        apply_update(doc, update, inserted)
+
+    async def bulk_write(self, requests, ordered=True):
+        # Sirf UpdateOne (user registry flush isi ko use karta hai)
+        for op in requests:
+            await self.update_one(op._filter, op._doc, upsert=op._upsert)
+
+    async def update_many(self, spec, update):
+        for doc in self.docs.values():
+            if doc_matches(doc, spec):
+                apply_update(doc, update)
+
+    async def find_one_and_update(self, spec, update, sort=None, return_document=None, upsert=False):
+        docs = [doc for doc in self.docs.values() if doc_matches(doc, spec)]
+        if not docs:
+            if upsert:
+                await self.update_one(spec, update, upsert=True)
+                return await self.find_one({"_id": spec["_id"]}) if "_id" in spec else None
+            return None
+        for key, direction in reversed(sort or []):
+            docs.sort(key=lambda d: d.get(key), reverse=direction < 0)
+        apply_update(docs[0], update)
+        return dict(docs[0])
+
+    async def delete_many(self, spec):
+        for key in [k for k, doc in self.docs.items() if doc_matches(doc, spec)]:
+            del self.docs[key]
+
+    async def count_documents(self, spec):
+        return sum(1 for doc in self.docs.values() if doc_matches(doc, spec))
+
+# ================= TMDB / SHORTLINK STUBS =================
+class FakeHttp:
+    # TMDB typo queries ko asli title par correct karta hai, shortener har url ka ek fixed short deta hai
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.corrections = {}
+        self.calls = {"tmdb": 0, "shortlink": 0}
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def get_json(self, url, params=None, any_status=False):
+        params = params or {}
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if url.startswith(main.TMDB_API_URL):
+            self.calls["tmdb"] += 1
+            title = self.corrections.get(main.clean_name(params.get("query", "")))
+            if not title:
+                return {"results": []}
+            return {"results": [{"id": abs(hash(title)) % 10**6, "title": title, "poster_path": f"/{abs(hash(title))}.jpg",
+                                 "release_date": "2020-01-01", "vote_average": 7.1}]}
+        self.calls["shortlink"] += 1
+        return {"status": "success", "shortenedUrl": f"https://{main.SHORT_DOMAIN}/{abs(hash(params.get('url'))):x}"}
+
+    async def get_bytes(self, url, params=None):
+        return None
+
+# ================= SYNTHETIC CATALOG =================
+SYLLABLES = ["ka", "ra", "ma", "dhu", "pu", "sh", "pa", "ja", "wan", "tan", "ha", "li", "zo", "ne", "vi", "kr",
+             "am", "bo", "ti", "go", "la", "sa", "ye", "ri", "dev", "mi", "ro", "chi", "un", "bha"]
+COMMON_WORDS = ["the", "return", "of", "king", "rise", "night", "war", "love", "story", "city", "last", "dark",
+                "man", "girl", "game", "house", "kingdom", "legend", "empire", "shadow", "fire", "rule", "hero"]
+QUALITIES = ["480p", "720p", "1080p", "2160p", "720p.HEVC", "1080p.x265"]
+SOURCES = ["WEB-DL", "WEBRip", "BluRay", "HDRip", "HDTV", "PreDVD", "CAMRip"]
+LANGUAGES = ["Hindi", "English", "Dual Audio", "Hindi.English", "Tamil", "Telugu"]
+EXTRAS = ["DD5.1", "AAC", "ESubs", "x264", ""]
+GROUPS = ["TeamX", "MoviesMod", "PSA", "Pahe", ""]
+
+def make_word(rng):
+    if rng.random() < 0.35:
+        return rng.choice(COMMON_WORDS)
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3)))
+
+def make_filename(rng, words, year, season=None, episode=None):
+    sep = rng.choice([".", ".", " ", "_"])
+    parts = [w.capitalize() for w in words]
+    if season is not None:
+        parts.append(f"S{season:02d}E{episode:02d}")
+    elif rng.random() < 0.7:
+        parts.append(f"({year})" if sep == " " and rng.random() < 0.5 else str(year))
+    parts += [rng.choice(QUALITIES), rng.choice(SOURCES), rng.choice(LANGUAGES)]
+    extra = rng.choice(EXTRAS)
+    if extra:
+        parts.append(extra)
+    name = sep.join(parts)
+    group = rng.choice(GROUPS)
+    if group:
+        name += f"-{group}"
+    if rng.random() < 0.15:
+        name = f"[@{rng.choice(['MoviesHub', 'CinemaX', 'FilmyZone'])}] " + name
+    return name + rng.choice([".mkv", ".mkv", ".mp4"])
+
+def synthetic_catalog(size, seed=7):
+    # Har title ke kai files (qualities / episodes), jaisa asli storage channel me hota hai
+    rng = random.Random(seed)
+    docs, titles = [], []
+    while len(docs) < size:
+        words = [make_word(rng) for _ in range(rng.choices([1, 2, 3, 4], [2, 4, 3, 1])[0])]
+        year = rng.randint(1980, 2026)
+        titles.append(" ".join(words))
+        if rng.random() < 0.2:
+            names = [make_filename(rng, words, year, s, e) for s in range(1, rng.randint(1, 3) + 1) for e in range(1, rng.randint(4, 10))]
+        else:
+            names = [make_filename(rng, words, year) for _ in range(rng.randint(1, 4))]
+        for name in names[: size - len(docs)]:
+            search_title, parsed_year = main.parse_caption_title(name)
+            docs.append({
+                "_id": main.ObjectId(),
+                "title": search_title,
+                "norm_title": main.clean_name(search_title),
+                "original_title": name,
+                "year": parsed_year,
+                "file_id": f"BQAD{rng.getrandbits(64):x}",
+                "file_unique_id": f"AgAD{rng.getrandbits(48):x}",
+                "file_type": "document"
+            })
+    return docs, titles
+
+def make_typo(rng, text):
+    chars = list(text)
+    for _ in range(1 if len(text) < 8 else 2):
+        i = rng.randrange(len(chars))
+        op = rng.choice(["drop", "swap", "sub", "dup"])
+        if op == "drop" and len(chars) > 3:
+            chars.pop(i)
+        elif op == "swap" and i + 1 < len(chars):
+            chars[i], chars[i + 1] = chars[i + 1], chars[i]
+        elif op == "sub":
+            chars[i] = rng.choice("abcdefghijklmnopqrstuvwxyz")
+        else:
+            chars.insert(i, chars[i])
+    return "".join(chars)
+
+def query_mix(titles, count, seed=11):
+    # (category, query, tmdb correction) - exact / typo / multi-word / no-hit
+    rng = random.Random(seed)
+    queries = []
+    for i in range(count):
+        title = rng.choice(titles)
+        kind = ("exact", "typo", "multi_word", "no_hit")[i % 4]
+        if kind == "exact":
+            queries.append((kind, title, None))
+        elif kind == "typo":
+            queries.append((kind, make_typo(rng, title), title))
+        elif kind == "multi_word":
+            extra = rng.choice(["", f" {rng.randint(1980, 2026)}", " hindi", " 1080p", " movie", " full movie download"])
+            queries.append((kind, f"{title.title()}{extra}", None))
+        else:
+            queries.append((kind, "".join(rng.choice("qxzjvw") for _ in range(rng.randint(5, 12))), None))
+    return queries
+
+# ================= MEASUREMENT =================
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))]
+
+def summarize(samples, elapsed):
+    return {
+        "count": len(samples),
+        "ops_per_sec": round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(statistics.fmean(samples) * 1000, 3) if samples else 0.0,
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p95_ms": round(percentile(samples, 95) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3)
+    }
+
+async def replay(items, fn, concurrency):
+    samples = []
+    pending = iter(items)
+
+    async def worker():
+        for item in pending:
+            started = time.perf_counter()
+            await fn(item)
+            samples.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(samples, time.perf_counter() - started)
+
+def reset_caches():
+    main._clean_name.cache_clear()
+    main.tmdb_cache.data.clear()
+    main.result_cache.data.clear()
+    main.search_reply_cache.data.clear()
+    main.shortlink_cache.clear()
+
+async def bench_catalog(size, query_count, concurrency, http):
+    docs, titles = synthetic_catalog(size)
+    queries = query_mix(titles, query_count)
+    http.corrections = {main.clean_name(q): title for _, q, title in queries if title}
+
+    main.app.movies = MemoryCollection("movies", docs)
+    main.app.shortlinks = MemoryCollection("shortlinks")
+    main.app.tmdb_cache = None
+    main.chat_meta.bot_username = BOT_USERNAME
+    reset_caches()
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    await main.search_index.build(main.app.movies)
+    build_seconds = time.perf_counter() - started
+    index_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    report = {"catalog_size": size, "titles": len(titles), "index_build_s": round(build_seconds, 3),
+              "index_peak_mb": round(index_peak / 2**20, 2), "benchmarks": {}}
+    benches = report["benchmarks"]
+
+    names = [doc["original_title"] for doc in docs]
+    sample = random.Random(3).sample(names, min(len(names), 5000))
+    main._clean_name.cache_clear()
+    benches["clean_name_cold"] = await replay(sample, lambda n: asyncio.sleep(0, main.clean_name(n)), 1)
+    benches["clean_name_warm"] = await replay(sample, lambda n: asyncio.sleep(0, main.clean_name(n)), 1)
+
+    results = {}
+
+    async def search(item):
+        results[item[1]] = await main.smart_db_search(main.app, item[1])
+
+    # Warm-up: fuzzy executor threads aur rapidfuzz pehli call par start hote hain
+    for _, query, _ in queries[:20]:
+        await main.smart_db_search(main.app, query)
+    main.tmdb_cache.data.clear()
+
+    for kind in ("exact", "typo", "multi_word", "no_hit"):
+        benches[f"search_{kind}"] = await replay([q for q in queries if q[0] == kind], search, concurrency)
+    benches["search_all"] = await replay(queries, search, concurrency)
+
+    hits = [(q, [res["_id"] for res in r]) for q, r in results.items() if r]
+
+    async def buttons(item):
+        query, ids = item
+        await main.get_search_buttons(main.cache_search_results(query, ids), query, ids)
+
+    main.shortlink_cache.clear()
+    benches["buttons_cold"] = await replay(hits, buttons, concurrency)
+    benches["buttons_warm"] = await replay(hits, buttons, concurrency)
+
+    # Memory alag pass me: tracemalloc timing ko bigaad deta hai
+    tracemalloc.start()
+    for _, query, _ in queries[:200]:
+        await main.smart_db_search(main.app, query)
+    report["search_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+    tracemalloc.stop()
+
+    report["hit_rate"] = {kind: round(sum(1 for k, q, _ in queries if k == kind and results.get(q)) / max(1, sum(1 for q in queries if q[0] == kind)), 3)
+                          for kind in ("exact", "typo", "multi_word", "no_hit")}
+    report["stub_calls"] = dict(http.calls)
+    return report
+
+# ================= RESULTS / REGRESSIONS =================
+def current_label():
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5).stdout.strip()
+    except Exception:
+        rev = ""
+    return rev or datetime.utcnow().strftime("%Y%m%d%H%M%S")
+
+def compare(current, baseline, threshold):
+    regressions = []
+    old_runs = {run["catalog_size"]: run for run in baseline.get("runs", [])}
+    for run in current["runs"]:
+        old = old_runs.get(run["catalog_size"])
+        if not old:
+            continue
+        for name, stats in run["benchmarks"].items():
+            before = old["benchmarks"].get(name)
+            if not before or not before["p95_ms"]:
+                continue
+            change = (stats["p95_ms"] - before["p95_ms"]) / before["p95_ms"]
+            flag = "  <-- REGRESSION" if change > threshold else ""
+            print(f"  {run['catalog_size']:>7} {name:<18} p95 {before['p95_ms']:>9.3f} -> {stats['p95_ms']:>9.3f} ms ({change:+.1%}){flag}")
+            if flag:
+                regressions.append((run["catalog_size"], name, change))
+    return regressions
+
+def print_run(run):
+    print(f"\n📚 Catalog {run['catalog_size']} files / {run['titles']} titles | index build {run['index_build_s']}s, "
+          f"index peak {run['index_peak_mb']} MB, search peak {run['search_peak_mb']} MB")
+    print(f"  {'benchmark':<18} {'ops/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, stats in run["benchmarks"].items():
+        print(f"  {name:<18} {stats['ops_per_sec']:>10} {stats['p50_ms']:>9} {stats['p95_ms']:>9} {stats['p99_ms']:>9}")
+    print(f"  hit rate: {run['hit_rate']} | stub calls: {run['stub_calls']}")
+
+async def run(args):
+    main.SHORTLINK_ENABLED = not args.no_shortlinks
+    http = FakeHttp(args.stub_latency / 1000)
+    main.app.http = http
+    runs = []
+    for size in args.sizes:
+        report = await bench_catalog(size, args.queries, args.concurrency, http)
+        print_run(report)
+        runs.append(report)
+    main.fuzzy_executor.shutdown(wait=False)
+    return {"label": args.label, "created_at": datetime.utcnow().isoformat(), "queries": args.queries,
+            "concurrency": args.concurrency, "stub_latency_ms": args.stub_latency, "runs": runs}
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline search benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--stub-latency", type=float, default=0.0, help="TMDB/shortlink stub latency (ms)")
+    parser.add_argument("--no-shortlinks", action="store_true")
+    parser.add_argument("--label", default=current_label())
+    parser.add_argument("--out", default=None)
+    parser.add_argument("--baseline", default=None, help="purana results JSON, p95 compare ke liye")
+    parser.add_argument("--threshold", type=float, default=0.15, help="p95 regression threshold (0.15 = 15%%)")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    result = asyncio.run(run(args))
+    out = args.out or os.path.join(BENCH_DIR, f"{args.label}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"\n💾 Results saved: {out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"\n📈 Compare vs {baseline.get('label')}:")
+        if compare(result, baseline, args.threshold):
+            raise SystemExit(1)
@@ -0,0 +1,375 @@
+# End-to-end load harness: asli handlers (search_movie, page_callback, start_cmd, add_to_db) ko
+# synthetic updates se chalata hai; Telegram, TMDB aur shortener local fakes hain
+#   python loadtest.py --scenario mixed --updates 500 --rate 50 --latency 80 --flood-rate 0.01
+#   python loadtest.py --scenario all --out /tmp/load.json
+import os
+
+os.environ.setdefault("TMDB_API_KEY", "bench")
+
+import argparse
+import asyncio
+import base64
+import contextvars
+import itertools
+import json
+import random
+import statistics
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+from pyrogram.errors import FloodWait
+
+import main
+from bench import FakeHttp, MemoryCollection, percentile, query_mix, synthetic_catalog
+
+SEARCH_CHAT_ID = -1001000000001
+STORAGE_CHAT_ID = -1001000000002
+BOT_USERNAME = "LoadTestBot"
+
+# Har update ka record (start / pehla reply / done) contextvar se fake API tak pahunchta hai
+current_update = contextvars.ContextVar("current_update", default=None)
+message_ids = itertools.count(1)
+
+# ================= FAKE TELEGRAM =================
+class FakeTelegram:
+    def __init__(self, latency, jitter, flood_rate, flood_seconds, seed=5):
+        self.latency = latency
+        self.jitter = jitter
+        self.flood_rate = flood_rate
+        self.flood_seconds = flood_seconds
+        self.rng = random.Random(seed)
+        self.calls = Counter()
+        self.floods = Counter()
+
+    def reset(self):
+        self.calls.clear()
+        self.floods.clear()
+
+    async def call(self, method, chat_id=None, **fields):
+        self.calls[method] += 1
+        delay = self.latency + (self.rng.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            await asyncio.sleep(delay)
+        if self.flood_rate and self.rng.random() < self.flood_rate:
+            self.floods[method] += 1
+            raise FloodWait(value=self.flood_seconds)
+        record = current_update.get()
+        if record is not None and record["first_reply"] is None:
+            record["first_reply"] = time.perf_counter()
+        return FakeMessage(self, chat_id, **fields)
+
+    def install(self, client):
+        # Pyrogram methods ko instance level par override karte hain; handlers wahi client dekhte hain
+        async def send_message(chat_id, text="", **kwargs):
+            return await self.call("send_message", chat_id, text=text)
+
+        async def send_photo(chat_id, photo=None, **kwargs):
+            file_id = photo if isinstance(photo, str) else f"AgACphoto{next(message_ids)}"
+            return await self.call("send_photo", chat_id, photo=SimpleNamespace(file_id=file_id))
+
+        async def send_cached_media(chat_id, file_id, **kwargs):
+            return await self.call("send_cached_media", chat_id)
+
+        async def send_media_group(chat_id, media, **kwargs):
+            first = await self.call("send_media_group", chat_id)
+            return [first] + [FakeMessage(self, chat_id) for _ in media[1:]]
+
+        async def copy_message(chat_id, from_chat_id, message_id, **kwargs):
+            return await self.call("copy_message", chat_id)
+
+        async def delete_messages(chat_id, message_ids, **kwargs):
+            await self.call("delete_messages", chat_id)
+            return True
+
+        async def edit_message_text(chat_id, message_id, text, **kwargs):
+            return await self.call("edit_message_text", chat_id, text=text)
+
+        async def get_chat_member(chat_id, user_id):
+            await self.call("get_chat_member", chat_id)
+            return SimpleNamespace(status="member")
+
+        async def get_chat(chat_id):
+            await self.call("get_chat", chat_id)
+            return SimpleNamespace(id=chat_id, invite_link=f"https://t.me/+{abs(chat_id)}", username=None)
+
+        async def get_me():
+            await self.call("get_me")
+            return SimpleNamespace(id=1, username=BOT_USERNAME)
+
+        for fn in (send_message, send_photo, send_cached_media, send_media_group, copy_message,
+                   delete_messages, edit_message_text, get_chat_member, get_chat, get_me):
+            setattr(client, fn.__name__, fn)
+
+class FakeMessage:
+    def __init__(self, api, chat_id, text=None, caption=None, user_id=None, document=None, photo=None):
+        self.api = api
+        self.id = next(message_ids)
+        self.chat = SimpleNamespace(id=chat_id)
+        self.from_user = SimpleNamespace(id=user_id, first_name=f"User{user_id}") if user_id else None
+        self.text = text
+        self.caption = caption
+        self.command = text[1:].split() if text and text.startswith("/") else None
+        self.document = document
+        self.video = None
+        self.photo = photo
+
+    async def reply(self, text, **kwargs):
+        return await self.api.call("send_message", self.chat.id, text=text)
+
+    reply_text = reply
+
+    async def edit(self, text, **kwargs):
+        return await self.api.call("edit_message_text", self.chat.id, text=text)
+
+    edit_text = edit
+
+    async def edit_reply_markup(self, reply_markup=None):
+        return await self.api.call("edit_message_reply_markup", self.chat.id)
+
+    async def delete(self):
+        await self.api.call("delete_messages", self.chat.id)
+        return True
+
+class FakeCallbackQuery:
+    def __init__(self, api, data, message, user_id):
+        self.api = api
+        self.data = data
+        self.message = message
+        self.from_user = SimpleNamespace(id=user_id, first_name=f"User{user_id}")
+
+    async def answer(self, text=None, show_alert=False):
+        return await self.api.call("answer_callback_query")
+
+# ================= SCENARIOS =================
+class Scenarios:
+    def __init__(self, api, docs, titles, rng):
+        self.api = api
+        self.docs = docs
+        self.titles = titles
+        self.rng = rng
+        self.queries = [q for _, q, _ in query_mix(titles, 400)]
+        self.pages = []
+        self.uploads = itertools.count()
+
+    def user(self):
+        return self.rng.randint(10_000, 10_000 + 5_000)
+
+    async def prepare_pages(self):
+        # Page callbacks ke liye pehle se search tokens chahiye (jaise asli users ke paas hote hain)
+        for title in self.titles[:200]:
+            results = await main.smart_db_search(main.app, title)
+            if len(results) > main.PAGE_SIZE:
+                ids = [res["_id"] for res in results]
+                self.pages.append((main.cache_search_results(main.clean_name(title), ids), len(ids)))
+        if not self.pages:
+            ids = [doc["_id"] for doc in self.docs[: main.PAGE_SIZE * 3]]
+            self.pages.append((main.cache_search_results("load test", ids), len(ids)))
+
+    def search(self):
+        msg = FakeMessage(self.api, SEARCH_CHAT_ID, text=self.rng.choice(self.queries), user_id=self.user())
+        return main.search_movie(main.app, msg)
+
+    def page(self):
+        token, total = self.rng.choice(self.pages)
+        offset = self.rng.randrange(0, total, main.PAGE_SIZE)
+        message = FakeMessage(self.api, SEARCH_CHAT_ID)
+        return main.page_callback(main.app, FakeCallbackQuery(self.api, f"page_{offset}_{token}", message, self.user()))
+
+    def start_file(self):
+        user_id = self.user()
+        msg = FakeMessage(self.api, user_id, text=f"/start file_{self.rng.choice(self.docs)['_id']}", user_id=user_id)
+        return main.start_cmd(main.app, msg)
+
+    def start_all(self):
+        user_id = self.user()
+        query = base64.urlsafe_b64encode(main.clean_name(self.rng.choice(self.titles)).encode()).decode().rstrip("=")
+        msg = FakeMessage(self.api, user_id, text=f"/start all_{query}", user_id=user_id)
+        return main.start_cmd(main.app, msg)
+
+    def ingest(self):
+        n = next(self.uploads)
+        base = self.rng.choice(self.docs)
+        name = base["original_title"] if self.rng.random() < 0.5 else f"Load Upload {n} {2000 + n % 25} 720p WEB-DL.mkv"
+        document = SimpleNamespace(file_id=f"BQADload{n}", file_unique_id=f"AgADload{n}", file_name=name)
+        msg = FakeMessage(self.api, STORAGE_CHAT_ID, caption=name, document=document)
+        return main.add_to_db(main.app, msg)
+
+    MIXED = (("search", 0.55), ("page", 0.2), ("start_file", 0.12), ("start_all", 0.05), ("ingest", 0.08))
+
+    def mixed(self):
+        kind = self.rng.choices([k for k, _ in self.MIXED], [w for _, w in self.MIXED])[0]
+        return getattr(self, kind)()
+
+SCENARIOS = ("search", "page", "start_file", "start_all", "ingest", "mixed")
+
+# ================= MEASUREMENT =================
+class LoopLagMonitor:
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.samples = []
+        self.task = None
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - expected))
+
+    def start(self):
+        self.samples = []
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+
+def ms_stats(samples):
+    if not samples:
+        return {"count": 0}
+    return {
+        "count": len(samples),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 2),
+        "p50_ms": round(percentile(samples, 50) * 1000, 2),
+        "p95_ms": round(percentile(samples, 95) * 1000, 2),
+        "p99_ms": round(percentile(samples, 99) * 1000, 2),
+        "max_ms": round(max(samples) * 1000, 2)
+    }
+
+async def drive(record, make_update):
+    token = current_update.set(record)
+    try:
+        await make_update()
+    except Exception as e:
+        record["error"] = repr(e)
+    finally:
+        record["done"] = time.perf_counter()
+        current_update.reset(token)
+
+async def ingest_drained():
+    # Ingest jobs -> pipeline queues -> notify jobs; dono taraf khali hone tak ruko
+    active = {"status": {"$in": ["pending", "running"]}, "kind": {"$in": ["ingest", "notify"]}}
+    while True:
+        for queue in main.ingest_pipeline.queues.values():
+            await queue.join()
+        if not await main.app.jobs.count_documents(active):
+            return
+        await asyncio.sleep(0.05)
+
+async def run_scenario(name, scenarios, api, updates, rate):
+    api.reset()
+    main.search_reply_cache.data.clear()
+    lag = LoopLagMonitor()
+    lag.start()
+    maker = getattr(scenarios, name)
+    records, tasks = [], []
+
+    started = time.perf_counter()
+    for i in range(updates):
+        if rate:
+            # Poisson arrivals: asli traffic burst me aata hai, fixed interval me nahi
+            await asyncio.sleep(scenarios.rng.expovariate(rate))
+        record = {"start": time.perf_counter(), "first_reply": None, "done": None, "error": None}
+        records.append(record)
+        tasks.append(asyncio.create_task(drive(record, lambda: maker())))
+    await asyncio.gather(*tasks)
+    handlers_done = time.perf_counter()
+    await ingest_drained()
+    finished = time.perf_counter()
+    await lag.stop()
+
+    errors = Counter(r["error"] for r in records if r["error"])
+    return {
+        "scenario": name,
+        "updates": updates,
+        "rate": rate or "burst",
+        "duration_s": round(handlers_done - started, 3),
+        "throughput_per_s": round(updates / (handlers_done - started), 1),
+        "ingest_drain_s": round(finished - handlers_done, 3),
+        "first_reply": ms_stats([r["first_reply"] - r["start"] for r in records if r["first_reply"]]),
+        "handler_done": ms_stats([r["done"] - r["start"] for r in records]),
+        "loop_lag": ms_stats(lag.samples),
+        "errors": dict(errors),
+        "api_calls": dict(api.calls.most_common()),
+        "flood_waits": dict(api.floods)
+    }
+
+def print_report(report):
+    print(f"\n🚦 {report['scenario']}: {report['updates']} updates @ {report['rate']}/s in {report['duration_s']}s "
+          f"({report['throughput_per_s']}/s), ingest drain {report['ingest_drain_s']}s")
+    for key in ("first_reply", "handler_done", "loop_lag"):
+        stats = report[key]
+        if stats["count"]:
+            print(f"  {key:<13} p50 {stats['p50_ms']:>9} | p95 {stats['p95_ms']:>9} | p99 {stats['p99_ms']:>9} | max {stats['max_ms']:>9} ms")
+    print(f"  api calls: {report['api_calls']}")
+    if report["flood_waits"]:
+        print(f"  flood waits: {report['flood_waits']}")
+    if report["errors"]:
+        print(f"  errors: {report['errors']}")
+
+async def setup(args):
+    main.SEARCH_CHAT = SEARCH_CHAT_ID
+    main.STORAGE_CHANNEL = STORAGE_CHAT_ID
+    main.SHORTLINK_ENABLED = not args.no_shortlinks
+    main.INGEST_BATCH_WAIT = args.batch_wait
+
+    docs, titles = synthetic_catalog(args.catalog)
+    http = FakeHttp(args.http_latency / 1000)
+    http.corrections = {main.clean_name(q): title for _, q, title in query_mix(titles, 400) if title}
+    main.app.http = http
+
+    client = main.app
+    client.movies = MemoryCollection("movies", docs)
+    for attr in ("requests", "users", "shortlinks", "broadcasts", "autodelete", "imports", "posters", "jobs"):
+        setattr(client, attr, MemoryCollection(attr))
+    client.tmdb_cache = None
+
+    api = FakeTelegram(args.latency / 1000, args.jitter / 1000, args.flood_rate, args.flood_seconds)
+    api.install(client)
+    await main.search_index.build(client.movies)
+    await main.chat_meta.refresh(client)
+    client.bg_tasks = main.start_services(client, main.datetime.utcnow())
+
+    scenarios = Scenarios(api, docs, titles, random.Random(args.seed))
+    await scenarios.prepare_pages()
+    return api, scenarios, http
+
+async def run(args):
+    api, scenarios, http = await setup(args)
+    names = SCENARIOS if args.scenario == "all" else (args.scenario,)
+    reports = []
+    for name in names:
+        report = await run_scenario(name, scenarios, api, args.updates, args.rate)
+        report["stub_calls"] = dict(http.calls)
+        print_report(report)
+        reports.append(report)
+    for task in main.app.bg_tasks:
+        task.cancel()
+    main.fuzzy_executor.shutdown(wait=False)
+    return reports
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="End-to-end handler load test")
+    parser.add_argument("--scenario", choices=SCENARIOS + ("all",), default="mixed")
+    parser.add_argument("--updates", type=int, default=300)
+    parser.add_argument("--rate", type=float, default=0, help="updates/sec (0 = ek saath burst)")
+    parser.add_argument("--catalog", type=int, default=10000)
+    parser.add_argument("--latency", type=float, default=50, help="fake Telegram API latency (ms)")
+    parser.add_argument("--jitter", type=float, default=30, help="latency ke upar random jitter (ms)")
+    parser.add_argument("--flood-rate", type=float, default=0.0, help="har API call par FloodWait ki probability")
+    parser.add_argument("--flood-seconds", type=int, default=1)
+    parser.add_argument("--http-latency", type=float, default=120, help="TMDB/shortlink stub latency (ms)")
+    parser.add_argument("--batch-wait", type=float, default=main.INGEST_BATCH_WAIT)
+    parser.add_argument("--no-shortlinks", action="store_true")
+    parser.add_argument("--seed", type=int, default=3)
+    parser.add_argument("--out", default=None)
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    reports = asyncio.run(run(args))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"args": vars(args), "reports": reports}, f, indent=2)
+        print(f"\n💾 Report saved: {args.out}")
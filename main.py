@@ -6,15 +6,30 @@ import asyncio
 import aiohttp
 import logging
 import base64
-from datetime import datetime
+import hmac
+import sys
+import threading
+import traceback
+import contextlib
+import functools
+import heapq
+import time
+import secrets
+from collections import Counter, OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import lru_cache
 from pyrogram import Client, filters, idle
-from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton, BotCommand
-from pyrogram.errors import UserNotParticipant, UserIsBlocked, InputUserDeactivated
+from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton, BotCommand, InputMediaDocument, InputMediaVideo
+from pyrogram.file_id import FileId, FileType, FileUniqueId, FileUniqueType
+from pyrogram.errors import UserNotParticipant, UserIsBlocked, InputUserDeactivated, FloodWait
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from bson.objectid import ObjectId
 from aiohttp import web
-from urllib.parse import quote, unquote
-from fuzzywuzzy import fuzz
+from urllib.parse import unquote
+from rapidfuzz import fuzz, process
 
 # ================= CONFIGURATION =================
 def get_clean_var(key, default=""):
@@ -48,80 +63,823 @@ SHORT_API_KEY = get_clean_var("SHORT_API_KEY", "")
 
 SHORTLINK_ENABLED = True 
 PAGE_SIZE = 6 
+MEDIA_GROUP_SIZE = 10
+SEARCH_CANDIDATE_LIMIT = int(get_clean_var("SEARCH_CANDIDATE_LIMIT", "500"))
+SEARCH_TOP_K = int(get_clean_var("SEARCH_TOP_K", "100"))
+SEARCH_SCAN_BUDGET = int(get_clean_var("SEARCH_SCAN_BUDGET", "20000"))
+FUZZY_THREADS = int(get_clean_var("FUZZY_THREADS", "2"))
+FUZZY_WORKERS = int(get_clean_var("FUZZY_WORKERS", "-1"))
+CLEAN_NAME_CACHE_SIZE = int(get_clean_var("CLEAN_NAME_CACHE_SIZE", "50000"))
+RESULT_CACHE_SIZE = int(get_clean_var("RESULT_CACHE_SIZE", "2000"))
+RESULT_CACHE_TTL = int(get_clean_var("RESULT_CACHE_TTL", "600"))
+IMPORT_PAGE_SIZE = 200
+TMDB_BACKFILL_BATCH = int(get_clean_var("TMDB_BACKFILL_BATCH", "200"))
+TMDB_BACKFILL_CONCURRENCY = int(get_clean_var("TMDB_BACKFILL_CONCURRENCY", "2"))
+TMDB_BACKFILL_INTERVAL = int(get_clean_var("TMDB_BACKFILL_INTERVAL", "3600"))
+TMDB_BACKFILL_PAUSE = float(get_clean_var("TMDB_BACKFILL_PAUSE", "5"))
+TMDB_BACKFILL_RETRY = int(get_clean_var("TMDB_BACKFILL_RETRY", "300"))
+POSTER_CACHE_DIR = get_clean_var("POSTER_CACHE_DIR", "poster_cache")
+POSTER_CACHE_MAX_BYTES = int(get_clean_var("POSTER_CACHE_MAX_MB", "50")) * 1024 * 1024
+INGEST_QUEUE_SIZE = int(get_clean_var("INGEST_QUEUE_SIZE", "200"))
+INGEST_BATCH_SIZE = int(get_clean_var("INGEST_BATCH_SIZE", "50"))
+INGEST_BATCH_WAIT = float(get_clean_var("INGEST_BATCH_WAIT", "1.0"))
+INGEST_ENRICH_WORKERS = int(get_clean_var("INGEST_ENRICH_WORKERS", "3"))
+IMPORT_TMDB_CONCURRENCY = int(get_clean_var("IMPORT_TMDB_CONCURRENCY", "4"))
+BULK_SEND_RATE = float(get_clean_var("BULK_SEND_RATE", "25"))
+AUTODELETE_TICK = int(get_clean_var("AUTODELETE_TICK", "5"))
+AUTODELETE_BATCH = int(get_clean_var("AUTODELETE_BATCH", "500"))
+AUTODELETE_LEASE = int(get_clean_var("AUTODELETE_LEASE", "120"))
+NOTIFY_WORKERS = int(get_clean_var("NOTIFY_WORKERS", "5"))
+KNOWN_USERS_MAX = int(get_clean_var("KNOWN_USERS_MAX", "500000"))
+KNOWN_USER_TTL = int(get_clean_var("KNOWN_USER_TTL", "86400"))
+USER_FLUSH_INTERVAL = float(get_clean_var("USER_FLUSH_INTERVAL", "5"))
+USER_FLUSH_BATCH = int(get_clean_var("USER_FLUSH_BATCH", "1000"))
+BROADCAST_WORKERS = int(get_clean_var("BROADCAST_WORKERS", "10"))
+BROADCAST_BATCH = int(get_clean_var("BROADCAST_BATCH", "500"))
+BROADCAST_STATUS_INTERVAL = int(get_clean_var("BROADCAST_STATUS_INTERVAL", "15"))
+META_REFRESH_INTERVAL = int(get_clean_var("META_REFRESH_INTERVAL", "1800"))
+META_RETRY_INTERVAL = int(get_clean_var("META_RETRY_INTERVAL", "60"))
+SEARCH_COALESCE_TTL = int(get_clean_var("SEARCH_COALESCE_TTL", "15"))
+SHORTLINK_CONCURRENCY = int(get_clean_var("SHORTLINK_CONCURRENCY", "5"))
+SHORTLINK_PREWARM = get_clean_var("SHORTLINK_PREWARM", "on").lower() in ("1", "on", "true", "yes")
+HTTP_TIMEOUT = float(get_clean_var("HTTP_TIMEOUT", "5"))
+HTTP_POOL_SIZE = int(get_clean_var("HTTP_POOL_SIZE", "100"))
+HTTP_PER_HOST_LIMIT = int(get_clean_var("HTTP_PER_HOST_LIMIT", "20"))
+HTTP_DNS_CACHE_TTL = int(get_clean_var("HTTP_DNS_CACHE_TTL", "300"))
+TMDB_API_URL = "https://api.themoviedb.org/3"
+TMDB_CACHE_TTL = int(get_clean_var("TMDB_CACHE_TTL", "86400"))
+TMDB_CACHE_SIZE = int(get_clean_var("TMDB_CACHE_SIZE", "5000"))
+TMDB_CACHE_MONGO = get_clean_var("TMDB_CACHE_MONGO", "off").lower() in ("1", "on", "true", "yes")
+DEBUG_TOKEN = get_clean_var("DEBUG_TOKEN", "")
+LOOP_LAG_INTERVAL = float(get_clean_var("LOOP_LAG_INTERVAL", "0.5"))
+SLOW_CALLBACK_MS = int(get_clean_var("SLOW_CALLBACK_MS", "250"))
+DEBUG_PROFILE_MAX = int(get_clean_var("DEBUG_PROFILE_MAX", "60"))
+
+# Deploy roles: "all" = ek hi process (purana mode, Procfile ka default web); baaki roles alag processes me.
+# Ingest/worker processes scale karne par web ko ROLE=interactive do; "all" saath chale tab bhi jobs lease se safe hain
+ROLE_SERVICES = {
+    "all": {"updates", "ingest", "workers"},
+    "interactive": {"updates"},
+    "ingest": {"ingest"},
+    "workers": {"workers"},
+}
+
+def parse_role():
+    # `python main.py --role ingest` ya ROLE env var
+    args = sys.argv[1:]
+    for i, arg in enumerate(args):
+        if arg == "--role" and i + 1 < len(args):
+            return args[i + 1]
+        if arg.startswith("--role="):
+            return arg.split("=", 1)[1]
+    return get_clean_var("ROLE", "all")
+
+ROLE = parse_role().strip().lower()
+if ROLE not in ROLE_SERVICES:
+    raise SystemExit(f"❌ Unknown ROLE '{ROLE}'. Use one of: {', '.join(ROLE_SERVICES)}")
+SERVICES = ROLE_SERVICES[ROLE]
+JOB_LEASE = int(get_clean_var("JOB_LEASE", "60"))
+JOB_POLL_INTERVAL = float(get_clean_var("JOB_POLL_INTERVAL", "2"))
+JOB_MAX_ATTEMPTS = int(get_clean_var("JOB_MAX_ATTEMPTS", "5"))
+JOB_RETENTION = int(get_clean_var("JOB_RETENTION_DAYS", "7")) * 86400
+CATALOG_SYNC_INTERVAL = int(get_clean_var("CATALOG_SYNC_INTERVAL", "5"))
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# ================= METRICS =================
+# Chhota Prometheus-style registry: counters, latency histograms aur scrape-time gauges
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+class Metrics:
+    def __init__(self):
+        self.counters = defaultdict(float)
+        self.histograms = {}
+        self.gauges = {}
+
+    def inc(self, name, value=1, **labels):
+        self.counters[(name, tuple(sorted(labels.items())))] += value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        hist = self.histograms.get(key)
+        if hist is None:
+            hist = self.histograms[key] = {"buckets": [0] * len(LATENCY_BUCKETS), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                hist["buckets"][i] += 1
+        hist["sum"] += seconds
+        hist["count"] += 1
+
+    def gauge(self, name, fn):
+        self.gauges[name] = fn
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc(f"{name}_errors_total", **labels)
+            raise
+        finally:
+            self.observe(f"{name}_seconds", time.perf_counter() - started, **labels)
+
+    async def render(self):
+        lines = []
+        typed = set()
+
+        def declare(name, kind):
+            # Prometheus format: har metric family ke liye ek hi "# TYPE" line, samples se pehle
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in sorted(self.counters.items()):
+            declare(name, "counter")
+            lines.append(f"{name}{format_labels(labels)} {value}")
+        for (name, labels), hist in sorted(self.histograms.items()):
+            declare(name, "histogram")
+            for bound, count in zip(LATENCY_BUCKETS, hist["buckets"]):
+                lines.append(f"{name}_bucket{format_labels(labels + (('le', bound),))} {count}")
+            lines.append(f"{name}_bucket{format_labels(labels + (('le', '+Inf'),))} {hist['count']}")
+            lines.append(f"{name}_sum{format_labels(labels)} {hist['sum']}")
+            lines.append(f"{name}_count{format_labels(labels)} {hist['count']}")
+        for name, fn in sorted(self.gauges.items()):
+            try:
+                value = fn()
+                if asyncio.iscoroutine(value):
+                    value = await value
+                declare(name, "gauge")
+                lines.append(f"{name} {value}")
+            except Exception as e:
+                logger.error(f"Gauge {name} Error: {e}")
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+
+def instrumented(name, **labels):
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with metrics.timer(name, **labels):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# Motor collection ke awaitable calls ka latency; find() cursors jaise ka taise pass hote hain
+TIMED_MONGO_OPS = {
+    "find_one", "insert_one", "insert_many", "update_one", "update_many", "replace_one",
+    "delete_one", "delete_many", "count_documents", "distinct", "bulk_write", "create_index",
+    "find_one_and_update"
+}
+
+class TimedCollection:
+    def __init__(self, collection):
+        self.collection = collection
+
+    def __getattr__(self, attr):
+        target = getattr(self.collection, attr)
+        if attr not in TIMED_MONGO_OPS:
+            return target
+
+        async def call(*args, **kwargs):
+            with metrics.timer("bot_mongo", collection=self.collection.name, op=attr):
+                return await target(*args, **kwargs)
+        return call
+
+# ================= RUNTIME DEBUG =================
+def frame_label(frame):
+    return f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno})"
+
+def function_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def task_summary(top=15):
+    # Tasks coroutine ke naam se group; saath me sabse andar wali await line (kahan atke hain)
+    groups = Counter()
+    waiting = defaultdict(Counter)
+    for task in asyncio.all_tasks():
+        coro = task.get_coro()
+        name = getattr(coro, "__qualname__", type(coro).__name__)
+        groups[name] += 1
+        frame = None
+        while coro is not None and getattr(coro, "cr_frame", None) is not None:
+            frame = coro.cr_frame
+            coro = coro.cr_await
+        if frame is not None:
+            waiting[name][frame_label(frame)] += 1
+
+    lines = [f"Tasks: {sum(groups.values())}"]
+    for name, count in groups.most_common(top):
+        where = waiting[name].most_common(1)
+        lines.append(f"{count:>6}  {name}" + (f"  @ {where[0][0]}" if where else ""))
+    return "\n".join(lines)
+
+class LoopMonitor:
+    def __init__(self):
+        self.samples = deque(maxlen=600)
+        self.heartbeat = time.monotonic()
+        self.loop_thread = None
+        self.stopped = threading.Event()
+        self.stalls = 0
+        self.last_stall = ""
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + LOOP_LAG_INTERVAL
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            lag = max(0.0, loop.time() - expected)
+            self.heartbeat = time.monotonic()
+            self.samples.append(lag)
+            metrics.observe("bot_event_loop_lag_seconds", lag)
+
+    def watchdog(self):
+        # Alag thread: heartbeat ruk jaye to loop thread ka stack log karo, yahi blocking callback hai
+        threshold = LOOP_LAG_INTERVAL + SLOW_CALLBACK_MS / 1000
+        reported = None
+        while not self.stopped.wait(SLOW_CALLBACK_MS / 2000):
+            heartbeat = self.heartbeat
+            stalled = time.monotonic() - heartbeat
+            if stalled < threshold or heartbeat == reported:
+                continue
+            reported = heartbeat
+            frame = sys._current_frames().get(self.loop_thread)
+            stack = "".join(traceback.format_stack(frame, limit=15)) if frame else "(no frame)"
+            self.stalls += 1
+            self.last_stall = f"{datetime.now().strftime('%H:%M:%S')} blocked {stalled * 1000:.0f}ms\n{stack}"
+            metrics.inc("bot_event_loop_stalls_total")
+            logger.warning(f"Event loop blocked for {stalled * 1000:.0f}ms:\n{stack}")
+
+    def start(self):
+        self.loop_thread = threading.get_ident()
+        self.heartbeat = time.monotonic()
+        self.stopped.clear()
+        threading.Thread(target=self.watchdog, name="loop-watchdog", daemon=True).start()
+        return asyncio.create_task(self.run())
+
+    def stop(self):
+        self.stopped.set()
+
+    def summary(self):
+        ordered = sorted(self.samples)
+        if not ordered:
+            return "Loop lag: no samples yet"
+        pick = lambda pct: ordered[min(len(ordered) - 1, int(pct * len(ordered)))] * 1000
+        return (
+            f"Loop lag (last {len(ordered)} ticks): p50 {pick(0.5):.1f}ms | p99 {pick(0.99):.1f}ms | max {ordered[-1] * 1000:.1f}ms\n"
+            f"Stalls > {SLOW_CALLBACK_MS}ms: {self.stalls}" + (f"\nLast stall: {self.last_stall}" if self.last_stall else "")
+        )
+
+loop_monitor = LoopMonitor()
+
+def sample_stacks(seconds, interval=0.005):
+    # Sampling profiler: har interval par sabhi threads ke stacks (loop + fuzzy executor), watchdog chhod ke
+    names = {t.ident: t.name for t in threading.enumerate()}
+    skip = {threading.get_ident()} | {ident for ident, name in names.items() if name == "loop-watchdog"}
+    self_counts, total_counts = Counter(), Counter()
+    samples = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident in skip:
+                continue
+            self_counts[f"[{names.get(ident, ident)}] {function_label(frame.f_code)}"] += 1
+            seen = set()
+            while frame is not None:
+                if frame.f_code not in seen:
+                    seen.add(frame.f_code)
+                    total_counts[function_label(frame.f_code)] += 1
+                frame = frame.f_back
+        samples += 1
+        time.sleep(interval)
+    return samples, self_counts, total_counts
+
+profile_lock = asyncio.Lock()
+
+async def run_profile(seconds=5, top=20):
+    seconds = max(1, min(int(seconds), DEBUG_PROFILE_MAX))
+    if profile_lock.locked():
+        return "Ek profile pehle se chal raha hai, thodi der baad try karein."
+    async with profile_lock:
+        samples, self_counts, total_counts = await asyncio.to_thread(sample_stacks, seconds)
+
+    lines = [f"Profile: {seconds}s, {samples} samples", "", "Self (top of stack):"]
+    lines += [f"{count / samples:>6.1%}  {label}" for label, count in self_counts.most_common(top)]
+    lines += ["", "Cumulative:"]
+    lines += [f"{count / samples:>6.1%}  {label}" for label, count in total_counts.most_common(top)]
+    return "\n".join(lines)
+
+def debug_authorized(request):
+    if not DEBUG_TOKEN:
+        return False
+    auth = request.headers.get("Authorization", "")
+    supplied = auth[7:] if auth.startswith("Bearer ") else request.query.get("token", "")
+    return hmac.compare_digest(supplied.encode(), DEBUG_TOKEN.encode())
+
+# ================= HTTP CLIENT =================
+# Poore bot ke liye ek hi pooled aiohttp session (keep-alive, per-host limit, DNS cache)
+class HttpClient:
+    def __init__(self):
+        self.session = None
+
+    async def start(self):
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_SIZE,
+            limit_per_host=HTTP_PER_HOST_LIMIT,
+            ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+            keepalive_timeout=60
+        )
+        self.session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT))
+
+    async def close(self):
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+    async def get_json(self, url, params=None, any_status=False):
+        async with self.session.get(url, params=params) as resp:
+            if resp.status != 200 and not any_status:
+                return None
+            return await resp.json(content_type=None)
+
+    async def get_bytes(self, url, params=None):
+        async with self.session.get(url, params=params) as resp:
+            if resp.status != 200:
+                return None
+            return await resp.read()
+
 # ================= BOT CLIENT =================
 class MovieBot(Client):
     def __init__(self):
-        super().__init__("pratap_session", api_id=API_ID, api_hash=API_HASH, bot_token=BOT_TOKEN)
+        # Sirf "updates" wala process Telegram updates leta hai; baaki roles sirf API calls karte hain
+        session = "pratap_session" if ROLE in ("all", "interactive") else f"pratap_session_{ROLE}"
+        super().__init__(session, api_id=API_ID, api_hash=API_HASH, bot_token=BOT_TOKEN, no_updates="updates" not in SERVICES)
         self.movies = None
         self.requests = None
         self.users = None
+        self.tmdb_cache = None
+        self.shortlinks = None
+        self.broadcasts = None
+        self.autodelete = None
+        self.imports = None
+        self.posters = None
+        self.jobs = None
+        self.http = HttpClient()
+        self.bg_tasks = []
 
     async def start(self):
-        await super().start()
+        await self.http.start()
         try:
             mongo_client = AsyncIOMotorClient(MONGO_URL)
             db = mongo_client["PratapCinemaBot"]
-            self.movies = db["movies"]
-            self.requests = db["movie_requests"]
-            self.users = db["users"]
+            self.movies = TimedCollection(db["movies"])
+            self.requests = TimedCollection(db["movie_requests"])
+            self.users = TimedCollection(db["users"])
+            self.shortlinks = TimedCollection(db["shortlinks"])
+            self.broadcasts = TimedCollection(db["broadcasts"])
+            self.autodelete = TimedCollection(db["autodelete"])
+            self.imports = TimedCollection(db["imports"])
+            self.posters = TimedCollection(db["posters"])
+            self.jobs = TimedCollection(db["jobs"])
+            if TMDB_CACHE_MONGO:
+                self.tmdb_cache = TimedCollection(db["tmdb_cache"])
             print("✅ MongoDB Connected Successfully!")
         except Exception as e:
             print(f"❌ MongoDB Connection Error: {e}")
 
         try:
-            await self.set_bot_commands([
-                BotCommand("start", "Bot start karein ya file access karein"),
-                BotCommand("pratap", "Database ki movies aur bot stats dekhein (Admin)"),
-                BotCommand("stats", "Bot ka full status aur count dekhein (Admin)"),
-                BotCommand("requests", "Pending movie requests ki list dekhein (Admin)"),
-                BotCommand("delreq", "Koi ek movie request delete karein (Admin)"),
-                BotCommand("clearreq", "Saari pending requests clear karein (Admin)"),
-                BotCommand("shortlink", "Shortlink enable ya disable karein (Admin)"),
-                BotCommand("del", "Database se movie delete karein (Admin)"),
-                BotCommand("delall", "Database se movies delete karein (Admin)"),
-                BotCommand("broadcast", "Sabhi users ko message bhejein (Admin)")
-            ])
-            print("✅ Telegram Menu Commands Configured!")
+            await ensure_indexes(self)
+            print("✅ MongoDB Indexes Ready!")
         except Exception as e:
-            print(f"⚠️ Could not set menu commands: {e}")
+            print(f"❌ MongoDB Index Error: {e}")
 
-        print(f"🚀 BOT STARTED as @{self.me.username}")
+        try:
+            migrated = await migrate_norm_titles(self.movies)
+            if migrated:
+                print(f"✅ Normalized titles migrated for {migrated} files")
+        except Exception as e:
+            print(f"❌ Title Migration Error: {e}")
+
+        try:
+            migrated = await migrate_file_unique_ids(self.movies)
+            if migrated:
+                print(f"✅ File unique ids migrated for {migrated} files")
+        except Exception as e:
+            print(f"❌ File Unique Id Migration Error: {e}")
+
+        # Index updates aane se pehle ready hona chahiye, isliye Telegram start se pehle build
+        sync_from = datetime.utcnow()
+        if "updates" in SERVICES:
+            try:
+                await search_index.build(self.movies)
+                print(f"✅ Search Index Ready! ({len(search_index)} files)")
+            except Exception as e:
+                print(f"❌ Search Index Build Error: {e}")
+
+        if "updates" in SERVICES:
+            try:
+                await user_registry.load(self.users)
+                print(f"✅ Known Users Loaded! ({len(user_registry)} users)")
+            except Exception as e:
+                print(f"❌ Known Users Load Error: {e}")
+
+        if SERVICES & {"updates", "workers"}:
+            try:
+                await request_index.build(self.requests)
+                print(f"✅ Request Index Ready! ({len(request_index)} queries)")
+            except Exception as e:
+                print(f"❌ Request Index Build Error: {e}")
+
+        await super().start()
+
+        if "updates" in SERVICES:
+            try:
+                await self.set_bot_commands([
+                    BotCommand("start", "Bot start karein ya file access karein"),
+                    BotCommand("pratap", "Database ki movies aur bot stats dekhein (Admin)"),
+                    BotCommand("stats", "Bot ka full status aur count dekhein (Admin)"),
+                    BotCommand("requests", "Pending movie requests ki list dekhein (Admin)"),
+                    BotCommand("delreq", "Koi ek movie request delete karein (Admin)"),
+                    BotCommand("clearreq", "Saari pending requests clear karein (Admin)"),
+                    BotCommand("shortlink", "Shortlink enable ya disable karein (Admin)"),
+                    BotCommand("del", "Database se movie delete karein (Admin)"),
+                    BotCommand("delall", "Database se movies delete karein (Admin)"),
+                    BotCommand("broadcast", "Sabhi users ko message bhejein (Admin)"),
+                    BotCommand("import", "Storage channel se poora catalog import karein (Admin)"),
+                    BotCommand("debug", "Tasks, loop lag ya profile dekhein (Admin)")
+                ])
+                print("✅ Telegram Menu Commands Configured!")
+            except Exception as e:
+                print(f"⚠️ Could not set menu commands: {e}")
+
+        await chat_meta.refresh(self)
+        self.bg_tasks.append(asyncio.create_task(chat_meta.refresh_loop(self)))
+        self.bg_tasks.append(loop_monitor.start())
+        self.bg_tasks.extend(start_services(self, sync_from))
+
+        try:
+            async for job in self.broadcasts.find({"status": "running"}, {"_id": 1}):
+                if await enqueue_broadcast(self, job["_id"]):
+                    print(f"🔁 Resuming broadcast {job['_id']}")
+        except Exception as e:
+            print(f"⚠️ Could not resume broadcasts: {e}")
+
+        try:
+            async for job in self.imports.find({"status": "running"}, {"_id": 1}):
+                if await enqueue_import(self, job["_id"]):
+                    print(f"🔁 Resuming import {job['_id']}")
+        except Exception as e:
+            print(f"⚠️ Could not resume imports: {e}")
+
+        print(f"🚀 BOT STARTED as @{self.me.username} (role: {ROLE})")
+
+    async def invoke(self, query, *args, **kwargs):
+        method = type(query).__name__
+        try:
+            with metrics.timer("bot_telegram", method=method):
+                return await super().invoke(query, *args, **kwargs)
+        except FloodWait as e:
+            metrics.inc("bot_telegram_floodwait_total", method=method)
+            metrics.inc("bot_telegram_floodwait_seconds_total", e.value, method=method)
+            raise
 
     async def stop(self, *args):
+        for task in self.bg_tasks:
+            task.cancel()
+        # Cancel hue tasks ko khatam hone do, taaki beech me ruka user flush apna batch wapas pending me daal de
+        if self.bg_tasks:
+            await asyncio.wait(self.bg_tasks, timeout=10)
+        loop_monitor.stop()
+        # Abhi tak flush na hue naye users shutdown par likh do
+        if self.users is not None:
+            await user_registry.flush(self.users)
         await super().stop()
+        await self.http.close()
         print("Bot Stopped.")
 
 app = MovieBot()
 
 # ================= HELPER & UTILS =================
-def clean_name(text):
-    if not text:
-        return ""
-    text = str(text).lower()
-
-    text = re.sub(r'@[a-zA-Z0-9_]+', '', text)
-    text = re.sub(r'https?://\S+|www\.\S+', '', text)
-    text = re.sub(r'\(.*?\)|\[.*?\]', '', text)
-
-    junk = [
+# Junk patterns purane sequential order ke teen compiled passes me: \bweb\b jaise word-boundary
+# patterns tabhi match karte hain jab pehle wale tokens hat chuke hon ("1080pweb" -> "web" -> "")
+JUNK_PATTERN_STAGES = [
+    [
+        r'@[a-zA-Z0-9_]+', r'https?://\S+|www\.\S+', r'\(.*?\)|\[.*?\]',
         r's\d{1,2}e\d{1,2}', r's\d{1,2}', r'e\d{1,2}', r'season\s*\d+', r'episodes?\s*\d+',
         r'combined', r'complete', r'part\s*\d+', r'vol\s*\d+',
         r'1080p', r'720p', r'480p', r'2160p', r'4k', r'hevc', r'x264', r'x265',
         r'web-?dl', r'web-?rip', r'bluray', r'camrip', r'pre-?dvd', r'hdtv', r'hdrip', r'hsrip',
-        r'\bweb\b', r'\bdl\b', r'\bhs\b', r'\bhd\b', r'\bmkv\b', r'\bmp4\b', r'\bavi\b',
+    ],
+    [r'\bweb\b', r'\bdl\b', r'\bhs\b', r'\bhd\b', r'\bmkv\b', r'\bmp4\b', r'\bavi\b'],
+    [
         r'hindi', r'english', r'italian', r'dual audio', r'esubs', r'sub',
         r'aac', r'dd5', r'lol', r'ms', r'join'
-    ]
+    ],
+]
+JUNK_RES = [re.compile("|".join(f"(?:{p})" for p in stage), re.IGNORECASE) for stage in JUNK_PATTERN_STAGES]
+NON_ALNUM_RE = re.compile(r'[^a-zA-Z0-9\s]')
+# clean_name ka output badle to bump karo; startup migration stored norm_title dobara likhega
+NORM_VERSION = 2
+
+@lru_cache(maxsize=CLEAN_NAME_CACHE_SIZE)
+def _clean_name(text):
+    text = text.lower()
+    for junk_re in JUNK_RES:
+        text = junk_re.sub('', text)
+    text = NON_ALNUM_RE.sub(' ', text)
+    return " ".join(text.split())
+
+def clean_name(text):
+    if not text:
+        return ""
+    return _clean_name(str(text))
+
+# Group queries me "dubbed / tamil / full movie" jaise words TMDB search ko khali kar dete hain
+TMDB_QUERY_STRIP_RE = re.compile(r'(?i)\b(hindi|dubbed|english|tamil|telugu|full|movie|720p|1080p|480p|web-dl|hdrip|bluray)\b')
 
-    for word in junk:
-        text = re.sub(word, '', text, flags=re.IGNORECASE)
+def tmdb_query(text):
+    # Spell-check, poster aur upcoming teeno ka ek hi TMDB key, taaki cache share ho
+    if not text:
+        return ""
+    return clean_name(TMDB_QUERY_STRIP_RE.sub('', str(text)))
+
+# (collection attribute, keys, options) - MovieBot.start par ek baar ensure hote hain
+MONGO_INDEXES = [
+    ("users", [("user_id", 1)], {"unique": True}),
+    ("movies", [("norm_title", 1)], {}),
+    ("movies", [("file_unique_id", 1)], {}),
+    ("movies", [("file_id", 1)], {}),
+    ("requests", [("user_id", 1), ("query", 1)], {"unique": True}),
+    ("requests", [("query", 1)], {}),
+    ("broadcasts", [("status", 1)], {}),
+    ("autodelete", [("due_at", 1)], {}),
+    ("tmdb_cache", [("expires_at", 1)], {"expireAfterSeconds": 0}),
+    ("movies", [("updated_at", 1)], {}),
+    ("jobs", [("kind", 1), ("status", 1), ("run_after", 1)], {}),
+    ("jobs", [("finished_at", 1)], {"expireAfterSeconds": JOB_RETENTION}),
+]
+
+async def ensure_indexes(client):
+    for attr, keys, options in MONGO_INDEXES:
+        collection = getattr(client, attr)
+        if collection is None:
+            continue
+        try:
+            await collection.create_index(keys, **options)
+        except Exception as e:
+            # Purane duplicate data ki wajah se unique index fail ho sakta hai; bot phir bhi chale
+            logger.error(f"Index {attr}.{keys} Error: {e}")
+            if options.get("unique"):
+                await collection.create_index(keys)
+
+def doc_norm_title(doc):
+    return doc.get("norm_title") or clean_name(doc.get("title", ""))
+
+async def migrate_norm_titles(collection, batch_size=500):
+    # Purane (ya pichhle NORM_VERSION wale) docs par norm_title likh do, next start par kuch nahi milega
+    ops = []
+    migrated = 0
+    async for doc in collection.find({"norm_version": {"$ne": NORM_VERSION}}, {"title": 1}):
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"norm_title": clean_name(doc.get("title", "")), "norm_version": NORM_VERSION}}))
+        if len(ops) >= batch_size:
+            await collection.bulk_write(ops, ordered=False)
+            migrated += len(ops)
+            ops = []
+    if ops:
+        await collection.bulk_write(ops, ordered=False)
+        migrated += len(ops)
+    return migrated
+
+def file_unique_id_from(file_id):
+    # Video/document ka file_unique_id media_id se hi banta hai (pyrogram bhi yahi karta hai)
+    try:
+        decoded = FileId.decode(file_id)
+        return FileUniqueId(file_unique_type=FileUniqueType.DOCUMENT, media_id=decoded.media_id).encode()
+    except Exception:
+        return None
+
+async def migrate_file_unique_ids(collection, batch_size=500):
+    # One-shot: purane docs (sirf file_id) par file_unique_id, taaki /import unhe duplicate pehchane
+    ops = []
+    migrated = 0
+    async for doc in collection.find({"file_unique_id": {"$exists": False}}, {"file_id": 1}):
+        unique_id = file_unique_id_from(doc.get("file_id"))
+        if not unique_id:
+            continue
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"file_unique_id": unique_id}}))
+        if len(ops) >= batch_size:
+            await collection.bulk_write(ops, ordered=False)
+            migrated += len(ops)
+            ops = []
+    if ops:
+        await collection.bulk_write(ops, ordered=False)
+        migrated += len(ops)
+    return migrated
+
+# Chhota LRU cache jisme har entry ka apna expiry time hota hai
+class TTLCache:
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data = OrderedDict()
+
+    def __len__(self):
+        return len(self.data)
+
+    def get(self, key, default=None):
+        item = self.data.get(key)
+        if item is None:
+            return default
+        expires, value = item
+        if expires < time.monotonic():
+            del self.data[key]
+            return default
+        self.data.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl=None):
+        self.data[key] = (time.monotonic() + (ttl or self.ttl), value)
+        self.data.move_to_end(key)
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+
+    def pop(self, key):
+        self.data.pop(key, None)
+
+# Ek hi key ke concurrent calls ek hi in-flight task share karte hain
+class SingleFlight:
+    def __init__(self):
+        self.calls = {}
+
+    async def do(self, key, fn):
+        task = self.calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self.calls[key] = task
+            task.add_done_callback(lambda _: self.calls.pop(key, None))
+        # shield: ek caller ka wait_for timeout baaki waiters ka task cancel na kare
+        return await asyncio.shield(task)
+
+# Global send rate limit: FloodWait aane par sab workers ruk jate hain aur rate aadhi ho jati hai
+class TokenBucket:
+    def __init__(self, rate):
+        self.max_rate = rate
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.paused_until = 0
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def flood_wait(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.rate = max(1.0, self.rate / 2)
+        # Pause ke baad khali bucket se shuru, pause wale time ka refill nahi
+        self.tokens = 0
+        self.updated = self.paused_until
+
+    def success(self):
+        if self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + 0.05)
+
+send_bucket = TokenBucket(BULK_SEND_RATE)
+
+async def rate_limited_send(send):
+    # FloodWait par bucket pause karke dobara try; baaki errors caller handle karta hai
+    while True:
+        await send_bucket.acquire()
+        try:
+            result = await send()
+            send_bucket.success()
+            return result
+        except FloodWait as e:
+            send_bucket.flood_wait(e.value)
+
+async def run_pool(items, worker, workers):
+    items = iter(items)
 
-    text = re.sub(r'[^a-zA-Z0-9\s]', ' ', text)
-    return " ".join(text.split()).strip()
+    async def run():
+        for item in items:
+            await worker(item)
+
+    await asyncio.gather(*(run() for _ in range(workers)))
+
+# ================= TELEGRAM METADATA CACHE =================
+# Bot username, search group link aur FSUB invite link memory me; background me refresh hote hain
+class ChatMetaCache:
+    def __init__(self):
+        self.bot_username = None
+        self.group_link = MAIN_CHANNEL_LINK
+        self.fsub_invite = MAIN_CHANNEL_LINK
+        self.stale = asyncio.Event()
+
+    def invalidate(self):
+        self.stale.set()
+
+    def username(self):
+        # get_me refresh fail ho to pyrogram ka start() wala self.me
+        return self.bot_username or getattr(app.me, "username", None)
+
+    async def refresh(self, client):
+        self.stale.clear()
+        try:
+            me = await client.get_me()
+            self.bot_username = me.username
+        except Exception as e:
+            logger.error(f"Meta Refresh (get_me) Error: {e}")
+            self.stale.set()
+
+        if SEARCH_CHAT and SEARCH_CHAT != 0:
+            try:
+                search_group = await client.get_chat(SEARCH_CHAT)
+                self.group_link = search_group.invite_link or (f"https://t.me/{search_group.username}" if search_group.username else MAIN_CHANNEL_LINK)
+            except Exception as e:
+                logger.error(f"Meta Refresh (search group) Error: {e}")
+                self.stale.set()
+
+        if FSUB_CHANNEL and FSUB_CHANNEL != 0:
+            try:
+                self.fsub_invite = (await client.get_chat(FSUB_CHANNEL)).invite_link or MAIN_CHANNEL_LINK
+            except Exception as e:
+                logger.error(f"Meta Refresh (fsub channel) Error: {e}")
+                self.stale.set()
+
+    async def refresh_loop(self, client):
+        while True:
+            # Invalidate/error ke baad META_RETRY_INTERVAL me retry, warna normal interval par
+            try:
+                await asyncio.wait_for(self.stale.wait(), timeout=META_REFRESH_INTERVAL)
+                await asyncio.sleep(META_RETRY_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            await self.refresh(client)
+
+chat_meta = ChatMetaCache()
+
+# ================= TMDB CACHE =================
+tmdb_cache = TTLCache(TMDB_CACHE_SIZE, TMDB_CACHE_TTL)
+tmdb_flight = SingleFlight()
+
+async def tmdb_get(endpoint, query, **params):
+    if not TMDB_API_KEY:
+        return None
+    query = " ".join(str(query).lower().split())
+    params = {k: v for k, v in params.items() if v is not None}
+    key = f"{endpoint}|{query}|" + "&".join(f"{k}={v}" for k, v in sorted(params.items()))
+    data = tmdb_cache.get(key)
+    if data is not None:
+        metrics.inc("bot_tmdb_cache_hits_total")
+        return data
+    metrics.inc("bot_tmdb_cache_misses_total")
+    return await tmdb_flight.do(key, lambda: _tmdb_fetch(key, endpoint, query, params))
+
+@instrumented("bot_tmdb")
+async def _tmdb_fetch(key, endpoint, query, params):
+    if app.tmdb_cache is not None:
+        try:
+            doc = await app.tmdb_cache.find_one({"_id": key, "expires_at": {"$gt": datetime.utcnow()}})
+            if doc:
+                tmdb_cache.set(key, doc["data"])
+                return doc["data"]
+        except Exception as e:
+            logger.error(f"TMDB Cache Read Error: {e}")
+
+    data = await app.http.get_json(f"{TMDB_API_URL}/{endpoint}", params={"api_key": TMDB_API_KEY, "query": query, **params})
+    if data is None:
+        return None
+    data = {"results": data.get("results", [])}
+    tmdb_cache.set(key, data)
+
+    if app.tmdb_cache is not None:
+        try:
+            await app.tmdb_cache.update_one(
+                {"_id": key},
+                {"$set": {"data": data, "expires_at": datetime.utcnow() + timedelta(seconds=TMDB_CACHE_TTL)}},
+                upsert=True
+            )
+        except Exception as e:
+            logger.error(f"TMDB Cache Write Error: {e}")
+    return data
 
 async def notify_admins_about_request(client, user_name, user_id, user_mention, raw_query):
     alert_text = (
@@ -142,39 +900,129 @@ async def get_tmdb_corrected_title(query):
     if not TMDB_API_KEY:
         return query
     try:
-        clean_q = clean_name(query)
+        clean_q = tmdb_query(query)
         if not clean_q:
             return query
-        url = f"https://api.themoviedb.org/3/search/multi?api_key={TMDB_API_KEY}&query={quote(clean_q)}"
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, timeout=3.0) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    results = data.get("results", [])
-                    if results:
-                        top = results[0]
-                        corrected = top.get("title") or top.get("name") or top.get("original_title")
-                        if corrected:
-                            return corrected
+        data = await tmdb_get("search/multi", clean_q)
+        results = (data or {}).get("results", [])
+        if results:
+            top = results[0]
+            corrected = top.get("title") or top.get("name") or top.get("original_title")
+            if corrected:
+                return corrected
     except Exception as e:
         logger.error(f"TMDB Spell Check Error: {e}")
     return query
 
+# ================= POSTER ASSET CACHE =================
+# TMDB poster -> Telegram photo file_id (memory + Mongo "posters"); pehli upload ke baad sirf file_id bhejte hain
+poster_file_ids = {}
+
+def poster_disk_path(key):
+    return os.path.join(POSTER_CACHE_DIR, key.replace("/", "_"))
+
+def trim_poster_disk_cache():
+    # Dusre thread ka trim/write beech me file hata sakta hai, isliye FileNotFoundError skip
+    files = []
+    for entry in os.scandir(POSTER_CACHE_DIR):
+        try:
+            if entry.is_file():
+                st = entry.stat()
+                files.append((st.st_mtime, st.st_size, entry.path))
+        except FileNotFoundError:
+            continue
+    files.sort()
+    total = sum(size for _, size, _ in files)
+    for _, size, path in files:
+        if total <= POSTER_CACHE_MAX_BYTES:
+            break
+        total -= size
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def read_poster_file(key):
+    # Trim ne file abhi hatayi ho to cache miss maano, TMDB se dobara aa jayegi
+    try:
+        os.utime(poster_disk_path(key))
+        with open(poster_disk_path(key), "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+def write_poster_file(key, data):
+    os.makedirs(POSTER_CACHE_DIR, exist_ok=True)
+    with open(poster_disk_path(key), "wb") as f:
+        f.write(data)
+    trim_poster_disk_cache()
+
+async def load_poster_bytes(key):
+    data = await asyncio.to_thread(read_poster_file, key)
+    if data is None:
+        try:
+            data = await app.http.get_bytes(f"https://image.tmdb.org/t/p/{key}")
+        except Exception as e:
+            # Timeout/connection error: poster ke bina text post chala jaye
+            logger.error(f"Poster Download Error ({key}): {e!r}")
+            return None
+        if data:
+            await asyncio.to_thread(write_poster_file, key, data)
+    return data
+
+async def send_poster(client, chat_id, poster_path, size="w500", **kwargs):
+    key = f"{size}{poster_path}"
+    file_id = poster_file_ids.get(key)
+    if file_id is None and client.posters is not None:
+        doc = await client.posters.find_one({"_id": key})
+        if doc:
+            file_id = poster_file_ids[key] = doc["file_id"]
+
+    if file_id:
+        try:
+            return await client.send_photo(chat_id, photo=file_id, **kwargs)
+        except FloodWait:
+            raise
+        except Exception as e:
+            # file_id expire/invalid: cache se hatao aur dobara upload karo
+            logger.error(f"Cached Poster Error: {e}")
+            poster_file_ids.pop(key, None)
+
+    data = await load_poster_bytes(key)
+    if not data:
+        return await client.send_message(chat_id, text=kwargs.pop("caption", ""), **kwargs)
+
+    photo = io.BytesIO(data)
+    photo.name = "poster.jpg"
+    sent = await client.send_photo(chat_id, photo=photo, **kwargs)
+    if sent and sent.photo:
+        poster_file_ids[key] = sent.photo.file_id
+        if client.posters is not None:
+            try:
+                await client.posters.update_one({"_id": key}, {"$set": {"file_id": sent.photo.file_id}}, upsert=True)
+            except Exception as e:
+                logger.error(f"Poster Cache Save Error: {e}")
+    return sent
+
+def catalog_poster(results):
+    # Ingest par save hua TMDB poster; False matlab catalog ko abhi pata nahi, live lookup karo
+    checked = False
+    for doc in results:
+        if doc.get("poster_path"):
+            return doc["poster_path"]
+        checked = checked or doc.get("tmdb_checked", False)
+    return None if checked else False
+
 async def get_poster(query):
-    clean_q = clean_name(query)
+    clean_q = tmdb_query(query)
     if not TMDB_API_KEY or not clean_q: 
         return None
     try:
-        url = f"https://api.themoviedb.org/3/search/multi?api_key={TMDB_API_KEY}&query={quote(clean_q)}"
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, timeout=3.0) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    if data.get("results"):
-                        for item in data["results"]:
-                            poster_path = item.get("poster_path")
-                            if poster_path:
-                                return f"https://image.tmdb.org/t/p/w500{poster_path}"
+        data = await tmdb_get("search/multi", clean_q)
+        for item in (data or {}).get("results", []):
+            poster_path = item.get("poster_path")
+            if poster_path:
+                return poster_path
     except Exception as e:
         logger.error(f"TMDB Poster Error: {e}")
     return None
@@ -183,74 +1031,306 @@ async def check_upcoming_movie(query):
     if not TMDB_API_KEY:
         return None
 
-    clean_q = re.sub(r'(?i)\b(hindi|dubbed|english|tamil|telugu|full|movie|720p|1080p|480p|web-dl|hdrip|bluray)\b', '', query).strip()
-    if not clean_q:
-        clean_q = query
+    clean_q = tmdb_query(query) or query.strip()
 
     try:
-        url = f"https://api.themoviedb.org/3/search/multi?api_key={TMDB_API_KEY}&query={quote(clean_q)}"
-        timeout = aiohttp.ClientTimeout(total=4.0)
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            async with session.get(url) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    results = data.get("results", [])
-                    if not results:
-                        return None
-
-                    today = datetime.now().date()
-
-                    for item in results:
-                        rel_date_str = item.get("release_date") or item.get("first_air_date")
-                        if rel_date_str:
-                            try:
-                                rel_date = datetime.strptime(rel_date_str, "%Y-%m-%d").date()
-                                days_left = (rel_date - today).days
-                                title = item.get("title") or item.get("name") or item.get("original_title") or query
-                                poster_path = item.get("poster_path")
-                                poster_url = f"https://image.tmdb.org/t/p/w500{poster_path}" if poster_path else None
-
-                                if days_left > 0:
-                                    return {
-                                        "title": title,
-                                        "release_date": rel_date_str,
-                                        "days_remaining": f"{days_left} Days",
-                                        "status": "Upcoming",
-                                        "poster": poster_url
-                                    }
-                            except Exception:
-                                continue
-
-                    top_item = results[0]
-                    rel_date_str = top_item.get("release_date") or top_item.get("first_air_date") or "N/A"
-                    title = top_item.get("title") or top_item.get("name") or top_item.get("original_title") or query
-                    poster_path = top_item.get("poster_path")
-                    poster_url = f"https://image.tmdb.org/t/p/w500{poster_path}" if poster_path else None
-
-                    days_status = "N/A"
-                    if rel_date_str != "N/A":
-                        try:
-                            rel_date = datetime.strptime(rel_date_str, "%Y-%m-%d").date()
-                            if rel_date > today:
-                                days_status = f"{(rel_date - today).days} Days"
-                            else:
-                                days_status = "Already Released"
-                        except Exception:
-                            days_status = "N/A"
-
-                    return {
-                        "title": title,
-                        "release_date": rel_date_str,
-                        "days_remaining": days_status,
-                        "status": "TMDB Found",
-                        "poster": poster_url
-                    }
+        data = await tmdb_get("search/multi", clean_q)
+        if data is None:
+            return None
+        results = data.get("results", [])
+        if not results:
+            return None
+
+        today = datetime.now().date()
+
+        for item in results:
+            rel_date_str = item.get("release_date") or item.get("first_air_date")
+            if rel_date_str:
+                try:
+                    rel_date = datetime.strptime(rel_date_str, "%Y-%m-%d").date()
+                    days_left = (rel_date - today).days
+                    title = item.get("title") or item.get("name") or item.get("original_title") or query
+                    poster_path = item.get("poster_path")
+
+                    if days_left > 0:
+                        return {
+                            "title": title,
+                            "release_date": rel_date_str,
+                            "days_remaining": f"{days_left} Days",
+                            "status": "Upcoming",
+                            "poster_path": poster_path
+                        }
+                except Exception:
+                    continue
+
+        top_item = results[0]
+        rel_date_str = top_item.get("release_date") or top_item.get("first_air_date") or "N/A"
+        title = top_item.get("title") or top_item.get("name") or top_item.get("original_title") or query
+        poster_path = top_item.get("poster_path")
+
+        days_status = "N/A"
+        if rel_date_str != "N/A":
+            try:
+                rel_date = datetime.strptime(rel_date_str, "%Y-%m-%d").date()
+                if rel_date > today:
+                    days_status = f"{(rel_date - today).days} Days"
+                else:
+                    days_status = "Already Released"
+            except Exception:
+                days_status = "N/A"
+
+        return {
+            "title": title,
+            "release_date": rel_date_str,
+            "days_remaining": days_status,
+            "status": "TMDB Found",
+            "poster_path": poster_path
+        }
     except Exception as e:
         logger.error(f"TMDB Upcoming Error: {e}")
         return None
-    return None
+
+# ================= IN-MEMORY SEARCH INDEX =================
+def make_trigrams(text):
+    grams = set()
+    for word in text.split():
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+# Normalized text ka token + trigram inverted index, candidate generation ke liye
+class TrigramIndex:
+    def __init__(self):
+        self.texts = {}
+        self.tokens = defaultdict(set)
+        self.grams = defaultdict(set)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def add(self, key, text):
+        if key in self.texts:
+            self.remove(key)
+        self.texts[key] = text
+        for token in set(text.split()):
+            self.tokens[token].add(key)
+        for gram in make_trigrams(text):
+            self.grams[gram].add(key)
+
+    def remove(self, key):
+        text = self.texts.pop(key, None)
+        if text is None:
+            return
+        for table, parts in ((self.tokens, set(text.split())), (self.grams, make_trigrams(text))):
+            for part in parts:
+                keys = table.get(part)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del table[part]
+
+    def candidates(self, text, limit=SEARCH_CANDIDATE_LIMIT):
+        scores = Counter()
+        for token in set(text.split()):
+            for key in self.tokens.get(token, ()):
+                scores[key] += 2
+
+        # Rare trigrams pehle; bahut common trigrams budget khatam hone par skip ho jate hain
+        postings = sorted((self.grams[g] for g in make_trigrams(text) if g in self.grams), key=len)
+        budget = SEARCH_SCAN_BUDGET
+        for keys in postings:
+            if budget <= 0:
+                break
+            scores.update(keys)
+            budget -= len(keys)
+
+        return [key for key, _ in scores.most_common(limit)]
+
+QUALITY_RANKS = [("2160p", 4), ("4k", 4), ("1080p", 3), ("720p", 2), ("480p", 1)]
+YEAR_RE = re.compile(r'\b(19\d{2}|20\d{2})\b')
+
+def doc_rank(doc):
+    # Search tie-breakers: (year, quality) file name se
+    name = str(doc.get("original_title") or doc.get("title", "")).lower()
+    year_match = YEAR_RE.search(name)
+    quality = next((rank for tag, rank in QUALITY_RANKS if tag in name), 0)
+    return (int(year_match.group(1)) if year_match else 0, quality)
+
+# Poore catalog ka resident copy: _id -> doc aur pre-normalized titles ka TrigramIndex
+class SearchIndex:
+    def __init__(self):
+        self.docs = {}
+        self.ranks = {}
+        self.titles = TrigramIndex()
+        # TMDB canonical title (normalized) -> catalog ka norm_title
+        self.aliases = {}
+
+    def __len__(self):
+        return len(self.docs)
+
+    async def build(self, collection):
+        docs = {}
+        ranks = {}
+        titles = TrigramIndex()
+        aliases = {}
+        async for doc in collection.find({}):
+            doc_title = doc_norm_title(doc)
+            if not doc_title:
+                continue
+            docs[doc["_id"]] = doc
+            ranks[doc["_id"]] = doc_rank(doc)
+            titles.add(doc["_id"], doc_title)
+            if doc.get("tmdb_title"):
+                aliases[clean_name(doc["tmdb_title"])] = doc_title
+        self.docs, self.ranks, self.titles, self.aliases = docs, ranks, titles, aliases
+
+    def add(self, doc):
+        doc_title = doc_norm_title(doc)
+        if not doc_title:
+            return
+        self.docs[doc["_id"]] = doc
+        self.ranks[doc["_id"]] = doc_rank(doc)
+        self.titles.add(doc["_id"], doc_title)
+        if doc.get("tmdb_title"):
+            self.aliases[clean_name(doc["tmdb_title"])] = doc_title
+
+    def update(self, _id, fields):
+        doc = self.docs.get(_id)
+        if doc is not None:
+            doc.update(fields)
+            if fields.get("tmdb_title"):
+                self.aliases[clean_name(fields["tmdb_title"])] = doc_norm_title(doc)
+
+    def remove(self, ids):
+        for _id in ids:
+            self.docs.pop(_id, None)
+            self.ranks.pop(_id, None)
+            self.titles.remove(_id)
+
+    def get(self, _id):
+        return self.docs.get(_id)
+
+    def ids_containing(self, clean_q):
+        return [key for key, title in self.titles.texts.items() if clean_q in title]
+
+    def candidates(self, clean_q, limit=SEARCH_CANDIDATE_LIMIT):
+        return [(self.docs[key], self.titles.texts[key], self.ranks[key]) for key in self.titles.candidates(clean_q, limit)]
+
+search_index = SearchIndex()
+
+# Pending requests ki distinct normalized queries, titles jaisa hi index
+class RequestIndex:
+    def __init__(self):
+        self.queries = TrigramIndex()
+        self.synced_at = None
+
+    def __len__(self):
+        return len(self.queries)
+
+    async def build(self, collection):
+        cutoff = datetime.utcnow()
+        queries = TrigramIndex()
+        async for doc in collection.find({}, {"query": 1}):
+            if doc.get("query"):
+                queries.add(doc["query"], doc["query"])
+        self.queries = queries
+        self.synced_at = cutoff
+
+    async def sync(self, collection):
+        # Dusre process ki nayi requests: sirf ObjectId watermark ke baad wale docs (pehli baar full build).
+        # Deleted queries yahan nahi hatate; notify_requesters match ke baad Mongo me na mile to khud hata deta hai
+        if self.synced_at is None:
+            return await self.build(collection)
+        cutoff = datetime.utcnow()
+        # Thoda overlap: clock skew aur der se commit hue upserts ke liye (add idempotent hai)
+        since = ObjectId.from_datetime(self.synced_at - timedelta(seconds=30))
+        async for doc in collection.find({"_id": {"$gte": since}}, {"query": 1}):
+            self.add(doc.get("query"))
+        self.synced_at = cutoff
+
+    def add(self, query):
+        if query:
+            self.queries.add(query, query)
+
+    def remove(self, queries):
+        for query in queries:
+            self.queries.remove(query)
+
+    def clear(self):
+        self.queries = TrigramIndex()
+
+    def all(self):
+        return list(self.queries.texts)
+
+    def match(self, title):
+        return [q for q in self.queries.candidates(title) if q in title or fuzz.partial_ratio(q, title) > 80]
+
+request_index = RequestIndex()
 
 # ================= FIXED STRICT SEARCH LOGIC =================
+# Relevance tiers: exact > prefix > substring > all-words > fuzzy
+TIER_EXACT, TIER_PREFIX, TIER_SUBSTRING, TIER_ALL_WORDS, TIER_FUZZY = 5, 4, 3, 2, 1
+
+def match_tier(clean_q, words, doc_title):
+    if doc_title == clean_q:
+        return TIER_EXACT
+    if doc_title.startswith(clean_q):
+        return TIER_PREFIX
+    # 1. Direct Substring Match (e.g. 'lenin' in 'lenin 2026')
+    if clean_q in doc_title:
+        return TIER_SUBSTRING
+    # 2. Multi-word Match (Agar search me multiple words hon)
+    if len(words) > 1 and all(w in doc_title for w in words):
+        return TIER_ALL_WORDS
+    return 0
+
+fuzzy_executor = ThreadPoolExecutor(max_workers=FUZZY_THREADS, thread_name_prefix="fuzzy")
+
+def fuzzy_scores(clean_q, titles):
+    # Ek query vs saare titles ek hi C++ batch call me; workers GIL chhod kar multiple cores use karte hain
+    return process.cdist([clean_q], titles, scorer=fuzz.token_set_ratio, score_cutoff=85, workers=FUZZY_WORKERS)[0]
+
+async def score_candidates(clean_q, candidates, top_k=SEARCH_TOP_K):
+    words = clean_q.split()
+    heap = []
+    exact_hits = 0
+    fuzzy_pool = []
+
+    def push(item):
+        if len(heap) < top_k:
+            heapq.heappush(heap, item)
+        else:
+            heapq.heappushpop(heap, item)
+
+    for seq, (doc, doc_title, rank) in enumerate(candidates):
+        tier = match_tier(clean_q, words, doc_title)
+        if not tier:
+            fuzzy_pool.append((seq, doc, doc_title, rank))
+            continue
+
+        # Sirf top_k rakhte hain; tie par naya year / better quality aage
+        push(((tier, 100) + rank, -seq, doc))
+
+        # top_k exact hits mil gaye to baaki candidates unse upar nahi aa sakte (sirf tie-breaker bachta hai)
+        if tier == TIER_EXACT:
+            exact_hits += 1
+            if exact_hits >= top_k:
+                fuzzy_pool = []
+                break
+
+    # 3. Strict Fuzzy Match (token_set_ratio 85+), event loop ke bahar thread pool me
+    if fuzzy_pool and len(clean_q) > 3:
+        titles = [doc_title for _, _, doc_title, _ in fuzzy_pool]
+        loop = asyncio.get_running_loop()
+        scores = await loop.run_in_executor(fuzzy_executor, fuzzy_scores, clean_q, titles)
+        for (seq, doc, _, rank), ratio in zip(fuzzy_pool, scores):
+            if ratio >= 85:
+                push(((TIER_FUZZY, float(ratio)) + rank, -seq, doc))
+
+    return [doc for _, _, doc in sorted(heap, reverse=True)]
+
+@instrumented("bot_search")
 async def smart_db_search(client, query):
     if not query or not query.strip():
         return []
@@ -259,83 +1339,991 @@ async def smart_db_search(client, query):
     if not clean_q:
         clean_q = query.strip().lower()
 
-    words = clean_q.split()
-    all_docs = await client.movies.find({}).to_list(length=3000)
-    matched = []
-    
-    for doc in all_docs:
-        doc_title = clean_name(doc.get("title", ""))
-        if not doc_title:
-            continue
-        
-        # 1. Direct Substring Match (e.g. 'lenin' in 'lenin 2026')
-        if clean_q in doc_title:
-            matched.append(doc)
-            continue
-            
-        # 2. Multi-word Match (Agar search me multiple words hon)
-        if len(words) > 1 and all(w in doc_title for w in words):
-            matched.append(doc)
-            continue
+    matched = await score_candidates(clean_q, search_index.candidates(clean_q))
 
-        # 3. Strict Fuzzy Match (partial_ratio hata kar token_set_ratio 85+ par set kiya hai)
-        if len(clean_q) > 3 and fuzz.token_set_ratio(clean_q, doc_title) >= 85:
-            matched.append(doc)
+    # Catalog pehle se TMDB title jaanta hai to live spell-check ki zaroorat nahi
+    alias = search_index.aliases.get(clean_q)
+    if not matched and alias and alias != clean_q:
+        matched = await score_candidates(alias, search_index.candidates(alias))
 
     if not matched:
         corrected_title = await get_tmdb_corrected_title(query)
         clean_corrected = clean_name(corrected_title)
         if clean_corrected and clean_corrected != clean_q:
-            for doc in all_docs:
-                doc_title = clean_name(doc.get("title", ""))
-                if not doc_title:
-                    continue
-                if clean_corrected in doc_title:
-                    matched.append(doc)
-                elif len(clean_corrected) > 3 and fuzz.token_set_ratio(clean_corrected, doc_title) >= 85:
-                    matched.append(doc)
+            matched = await score_candidates(clean_corrected, search_index.candidates(clean_corrected))
 
     return matched
 
+@instrumented("bot_shortlink")
 async def get_shortlink(url):
     if not SHORTLINK_ENABLED: return url
     try:
-        api_url = f"https://{SHORT_DOMAIN}/api?api={SHORT_API_KEY}&url={url}"
-        async with aiohttp.ClientSession() as session:
-            async with session.get(api_url, timeout=10) as resp:
-                res = await resp.json()
-                if res.get("status") == "success": return res["shortenedUrl"]
+        res = await app.http.get_json(f"https://{SHORT_DOMAIN}/api", params={"api": SHORT_API_KEY, "url": url}, any_status=True)
+        if res and res.get("status") == "success": return res["shortenedUrl"]
     except Exception: pass
     return url
 
-async def get_search_buttons(query, results, offset=0):
+# Har movie ka shortlink ek baar banta hai: memory -> Mongo "shortlinks" -> shortener API
+shortlink_cache = {}
+shortlink_sem = asyncio.Semaphore(SHORTLINK_CONCURRENCY)
+
+async def make_shortlink(db_id, url):
+    async with shortlink_sem:
+        short = await get_shortlink(url)
+    if short != url:
+        shortlink_cache[db_id] = short
+        if app.shortlinks is not None:
+            try:
+                await app.shortlinks.update_one({"_id": db_id}, {"$set": {"url": short, "domain": SHORT_DOMAIN}}, upsert=True)
+            except Exception as e:
+                logger.error(f"Shortlink Save Error: {e}")
+    return short
+
+async def get_file_links(bot_username, ids):
+    direct = {db_id: f"https://t.me/{bot_username}?start=file_{db_id}" for db_id in ids}
+    # Username ke bina bana link kabhi shorten/persist nahi karna
+    if not SHORTLINK_ENABLED or not bot_username:
+        return direct
+
+    links = {db_id: shortlink_cache[db_id] for db_id in ids if db_id in shortlink_cache}
+    missing = [db_id for db_id in ids if db_id not in links]
+    if missing and app.shortlinks is not None:
+        try:
+            async for doc in app.shortlinks.find({"_id": {"$in": missing}, "domain": SHORT_DOMAIN}):
+                shortlink_cache[doc["_id"]] = links[doc["_id"]] = doc["url"]
+        except Exception as e:
+            logger.error(f"Shortlink Load Error: {e}")
+        missing = [db_id for db_id in missing if db_id not in links]
+
+    if missing:
+        shorts = await asyncio.gather(*(make_shortlink(db_id, direct[db_id]) for db_id in missing))
+        links.update(zip(missing, shorts))
+    return links
+
+async def forget_shortlinks(ids):
+    for db_id in ids:
+        shortlink_cache.pop(db_id, None)
+    if app.shortlinks is not None and ids:
+        await app.shortlinks.delete_many({"_id": {"$in": ids}})
+
+# Search ke ordered _id list ko ek chhote token ke peeche rakhte hain, callback_data me sirf token jata hai
+result_cache = TTLCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
+
+def cache_search_results(query, ids):
+    token = secrets.token_urlsafe(6)
+    result_cache.set(token, (query, ids))
+    return token
+
+async def get_search_buttons(token, query, ids, offset=0):
     btn_list = []
-    me = await app.get_me()
-    for res in results[offset : offset + PAGE_SIZE]:
-        db_id = str(res["_id"])
+    page = [res for res in map(search_index.get, ids[offset : offset + PAGE_SIZE]) if res]
+    links = await get_file_links(chat_meta.username(), [res["_id"] for res in page])
+    for res in page:
         db_title = res.get("original_title", res["title"])
         display_name = db_title[:35] + "..." if len(db_title) > 35 else db_title
-        bot_url = f"https://t.me/{me.username}?start=file_{db_id}"
-        final_link = await get_shortlink(bot_url)
+        final_link = links[res["_id"]]
         btn_list.append([InlineKeyboardButton(f"🎬 {display_name}", url=final_link)])
         
     nav_btns = []
     if offset > 0:
-        nav_btns.append(InlineKeyboardButton("⬅️ Back", callback_data=f"page_{offset - PAGE_SIZE}_{quote(query)}"))
-    if offset + PAGE_SIZE < len(results):
-        nav_btns.append(InlineKeyboardButton("Next ➡️", callback_data=f"page_{offset + PAGE_SIZE}_{quote(query)}"))
+        nav_btns.append(InlineKeyboardButton("⬅️ Back", callback_data=f"page_{offset - PAGE_SIZE}_{token}"))
+    if offset + PAGE_SIZE < len(ids):
+        nav_btns.append(InlineKeyboardButton("Next ➡️", callback_data=f"page_{offset + PAGE_SIZE}_{token}"))
     
     if nav_btns: btn_list.append(nav_btns)
     
     query_b64 = base64.urlsafe_b64encode(query.encode()).decode().rstrip("=")
-    btn_list.append([InlineKeyboardButton("📂 GET ALL FILES (IN PM) 📂", url=f"https://t.me/{me.username}?start=all_{query_b64}")])
+    btn_list.append([InlineKeyboardButton("📂 GET ALL FILES (IN PM) 📂", url=f"https://t.me/{chat_meta.username()}?start=all_{query_b64}")])
     return InlineKeyboardMarkup(btn_list)
 
-async def delete_after_delay(msgs, delay):
-    await asyncio.sleep(delay)
+# ================= AUTO DELETE SCHEDULER =================
+# Har pending delete Mongo "autodelete" me (chat_id, message_ids, due_at) ke roop me; restart ke baad bhi chalega
+async def schedule_delete(client, msgs, delay):
+    by_chat = defaultdict(list)
     for m in msgs:
-        try: await m.delete()
-        except Exception: pass
+        if m:
+            by_chat[m.chat.id].append(m.id)
+    if not by_chat:
+        return
+    due_at = datetime.utcnow() + timedelta(seconds=delay)
+    try:
+        await client.autodelete.insert_many([
+            {"chat_id": chat_id, "message_ids": ids, "due_at": due_at} for chat_id, ids in by_chat.items()
+        ])
+    except Exception as e:
+        logger.error(f"Auto Delete Schedule Error: {e}")
+
+async def run_due_deletes(client):
+    docs = await client.autodelete.find({"due_at": {"$lte": datetime.utcnow()}}).sort("due_at", 1).to_list(length=AUTODELETE_BATCH)
+    by_chat = defaultdict(list)
+    for doc in docs:
+        by_chat[doc["chat_id"]].extend(doc["message_ids"])
+
+    for chat_id, ids in by_chat.items():
+        for i in range(0, len(ids), 100):
+            chunk = ids[i:i + 100]
+            try:
+                await flood_retry(lambda: client.delete_messages(chat_id, chunk))
+            except Exception as e:
+                logger.error(f"Auto Delete Error in {chat_id}: {e}")
+
+    if docs:
+        await client.autodelete.delete_many({"_id": {"$in": [doc["_id"] for doc in docs]}})
+    return len(docs)
+
+async def autodelete_loop(client):
+    while True:
+        try:
+            # Kai worker processes ho to lease wala hi delete karega, warna same messages do baar delete hote
+            if await job_queue.hold_lease(client, "autodelete", AUTODELETE_LEASE):
+                # Restart ke baad backlog ho to bina ruke batches nikalo (har batch se pehle lease renew)
+                while await run_due_deletes(client) >= AUTODELETE_BATCH:
+                    if not await job_queue.hold_lease(client, "autodelete", AUTODELETE_LEASE):
+                        break
+        except Exception as e:
+            logger.error(f"Auto Delete Loop Error: {e}")
+        await asyncio.sleep(AUTODELETE_TICK)
+
+# ================= REQUEST NOTIFICATIONS =================
+async def notify_requesters(client, title, raw_caption):
+    queries = request_index.match(title)
+    if not queries:
+        return
+
+    reqs = await client.requests.find({"query": {"$in": queries}}).to_list(length=None)
+    text = (
+        f"🎉 Aapki requested movie **{raw_caption}** ab hamare database me add ho gayi hai!\n\n"
+        f"Search Group me jaakar download kar sakte hain."
+    )
+    done = []
+
+    async def send(req):
+        user_id = req.get("user_id")
+        try:
+            await rate_limited_send(lambda: client.send_message(user_id, text))
+            done.append(req["_id"])
+        except (UserIsBlocked, InputUserDeactivated):
+            done.append(req["_id"])
+        except Exception as e:
+            logger.error(f"Failed notification to {user_id}: {e}")
+
+    await run_pool(reqs, send, NOTIFY_WORKERS)
+    if done:
+        await client.requests.delete_many({"_id": {"$in": done}})
+    remaining = set(await client.requests.distinct("query", {"query": {"$in": queries}}))
+    request_index.remove([q for q in queries if q not in remaining])
+
+# ================= BROADCAST ENGINE =================
+def broadcast_report(job, total, finished):
+    done = job["success"] + job["blocked"] + job["failed"]
+    if finished:
+        header = "📊 **Broadcast Finished Report**"
+    else:
+        header = f"📢 **Broadcast chal raha hai...** (`{done}/{total}`)"
+    return (
+        f"{header}\n\n"
+        f"👥 **Total Users:** `{total}`\n"
+        f"✅ **Sent Successfully:** `{job['success']}`\n"
+        f"🚫 **Blocked/Deleted:** `{job['blocked']}`\n"
+        f"❌ **Failed:** `{job['failed']}`"
+    )
+
+async def broadcast_batch(client, job, batch):
+    dead_users = []
+
+    async def send(u):
+        uid = u.get("user_id")
+        if not uid:
+            return
+        try:
+            await rate_limited_send(lambda: client.copy_message(uid, job["from_chat_id"], job["message_id"]))
+            job["success"] += 1
+            metrics.inc("bot_broadcast_messages_total", result="success")
+        except (UserIsBlocked, InputUserDeactivated):
+            job["blocked"] += 1
+            dead_users.append(uid)
+            metrics.inc("bot_broadcast_messages_total", result="blocked")
+        except Exception:
+            job["failed"] += 1
+            metrics.inc("bot_broadcast_messages_total", result="failed")
+
+    await run_pool(batch, send, BROADCAST_WORKERS)
+    if dead_users:
+        await client.users.delete_many({"user_id": {"$in": dead_users}})
+        user_registry.forget(dead_users)
+
+async def run_broadcast(client, job_id):
+    job = await client.broadcasts.find_one({"_id": job_id})
+    if not job or job.get("status") != "running":
+        return
+
+    # Users _id order me stream hote hain; har batch ke baad last _id checkpoint hota hai
+    query = {"_id": {"$gt": job["last_id"]}} if job.get("last_id") else {}
+    total = job["success"] + job["blocked"] + job["failed"] + await client.users.count_documents(query)
+    cursor = client.users.find(query, {"user_id": 1}).sort("_id", 1).batch_size(BROADCAST_BATCH)
+    last_edit = time.monotonic()
+
+    async def checkpoint(batch):
+        nonlocal last_edit
+        await broadcast_batch(client, job, batch)
+        job["last_id"] = batch[-1]["_id"]
+        await client.broadcasts.update_one({"_id": job_id}, {"$set": {
+            "last_id": job["last_id"],
+            "success": job["success"],
+            "blocked": job["blocked"],
+            "failed": job["failed"],
+            "updated_at": datetime.now()
+        }})
+        if time.monotonic() - last_edit >= BROADCAST_STATUS_INTERVAL:
+            last_edit = time.monotonic()
+            try:
+                await client.edit_message_text(job["status_chat_id"], job["status_msg_id"], broadcast_report(job, total, False))
+            except Exception:
+                pass
+
+    try:
+        batch = []
+        async for u in cursor:
+            batch.append(u)
+            if len(batch) >= BROADCAST_BATCH:
+                await checkpoint(batch)
+                batch = []
+        if batch:
+            await checkpoint(batch)
+    except Exception as e:
+        # Job queue last_id checkpoint se dobara try karegi
+        logger.error(f"Broadcast {job_id} Error: {e}")
+        raise
+
+    await client.broadcasts.update_one({"_id": job_id}, {"$set": {"status": "done", "finished_at": datetime.now()}})
+    try:
+        await client.edit_message_text(job["status_chat_id"], job["status_msg_id"], broadcast_report(job, total, True))
+    except Exception as e:
+        logger.error(f"Broadcast Report Error: {e}")
+
+# ================= FILE DELIVERY =================
+def file_caption(res):
+    raw_title = res.get('original_title', res.get('title', 'Movie'))
+    clean_title = str(raw_title).split("\n")[0].split("JOIN")[0].replace("@Movies2026Cinema", "").strip()
+    safe_title = clean_title.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+    return (
+        f"<blockquote><a href='https://t.me/Movies2026Cinema'><b>{safe_title}</b></a>\n"
+        f"<b>JOIN ❤️: @Movies2026Cinema</b></blockquote>"
+    )
+
+def file_kind(res):
+    # Purane docs me file_type nahi hai, file_id se hi nikal lete hain
+    if res.get("file_type"):
+        return res["file_type"]
+    try:
+        return "video" if FileId.decode(res["file_id"]).file_type == FileType.VIDEO else "document"
+    except Exception:
+        return "document"
+
+def media_albums(results):
+    # Album me videos aur documents mix nahi ho sakte, aur max 10 items
+    albums = []
+    for res in results:
+        kind = file_kind(res)
+        if albums and albums[-1][0] == kind and len(albums[-1][1]) < MEDIA_GROUP_SIZE:
+            albums[-1][1].append(res)
+        else:
+            albums.append((kind, [res]))
+    return albums
+
+async def flood_retry(send, attempts=3):
+    # Fixed sleep nahi; sirf jab Telegram FloodWait bole tab rukna hai
+    for attempt in range(attempts):
+        try:
+            return await send()
+        except FloodWait as e:
+            if attempt == attempts - 1:
+                raise
+            await asyncio.sleep(e.value)
+
+async def send_files_batched(client, chat_id, results, sts):
+    sent_messages = []
+    for kind, album in media_albums(results):
+        media_cls = InputMediaVideo if kind == "video" else InputMediaDocument
+        media = [media_cls(res["file_id"], caption=file_caption(res), parse_mode=enums.ParseMode.HTML) for res in album]
+        try:
+            if len(media) > 1:
+                sent_messages.extend(await flood_retry(lambda: client.send_media_group(chat_id, media)))
+            else:
+                sent_messages.append(await flood_retry(lambda: client.send_cached_media(chat_id, album[0]["file_id"], caption=file_caption(album[0]), parse_mode=enums.ParseMode.HTML)))
+        except Exception as e:
+            logger.error(f"Album Send Error: {e}")
+            for res in album:
+                try:
+                    sent_messages.append(await flood_retry(lambda: client.send_cached_media(chat_id, res["file_id"], caption=file_caption(res), parse_mode=enums.ParseMode.HTML)))
+                except Exception:
+                    pass
+
+        try:
+            await sts.edit(f"📤 Sending files... `{len(sent_messages)}/{len(results)}`")
+        except Exception:
+            pass
+    return sent_messages
+
+# ================= CATALOG INGEST HELPERS =================
+QUALITY_TAIL_RE = re.compile(r'(?i)\b(360p|420p|480p|720p|780p|1080p|1080|2160p|4k|2k|hd|hdr|web-dl|webrip|hdrip|bluray|hdtv|x264|x265|hevc|10bit|aac|ddp|esub|sub|hindi|english|mkv|mp4|avi)\b.*')
+
+def parse_caption_title(raw_caption):
+    clean_text = raw_caption.replace('.', ' ').replace('_', ' ')
+    year_match = YEAR_RE.search(clean_text)
+    year = year_match.group(1) if year_match else None
+
+    if year:
+        search_title = clean_text.split(year)[0].strip()
+    else:
+        search_title = QUALITY_TAIL_RE.sub('', clean_text).strip()
+
+    search_title = QUALITY_TAIL_RE.sub('', search_title).strip()
+    if not search_title:
+        search_title = clean_text.strip()
+    return search_title, year
+
+def make_movie_doc(msg, file):
+    raw_caption = msg.caption or file.file_name or "Unknown Movie"
+    search_title, year = parse_caption_title(raw_caption)
+    return {
+        "title": search_title,
+        "norm_title": clean_name(search_title),
+        "norm_version": NORM_VERSION,
+        "original_title": raw_caption,
+        "year": year,
+        "file_id": file.file_id,
+        "file_unique_id": file.file_unique_id,
+        "file_type": "video" if msg.video else "document"
+    }
+
+class TMDBUnavailable(Exception):
+    # 429 / timeout / network error: "no match" nahi hai, baad me dobara try karna hai
+    pass
+
+async def tmdb_search(endpoint, search_title, **params):
+    try:
+        data = await tmdb_get(endpoint, search_title, **params)
+    except Exception as e:
+        raise TMDBUnavailable(str(e)) from e
+    if data is None:
+        raise TMDBUnavailable(f"{endpoint} failed")
+    return data.get("results", [])
+
+async def fetch_tmdb_details(search_title, year):
+    # None sirf tab jab TMDB ne pakka jawab diya ki match nahi hai; failure par TMDBUnavailable
+    if not TMDB_API_KEY:
+        raise TMDBUnavailable("TMDB_API_KEY not set")
+    results = await tmdb_search("search/movie", search_title, primary_release_year=year)
+
+    if not results and year:
+        results = await tmdb_search("search/movie", search_title)
+
+    if not results:
+        results = await tmdb_search("search/multi", search_title)
+
+    for item in results:
+        if item.get("poster_path"):
+            return {
+                "tmdb_id": item.get("id"),
+                "tmdb_title": item.get("title") or item.get("name"),
+                "release_date": item.get("release_date") or item.get("first_air_date") or "N/A",
+                "rating": item.get("vote_average", "N/A"),
+                "poster_path": item["poster_path"]
+            }
+    return None
+
+TMDB_FIELDS = ("tmdb_id", "tmdb_title", "release_date", "rating", "poster_path")
+TMDB_FIELDS_PROJECTION = {k: 1 for k in TMDB_FIELDS}
+
+async def save_tmdb_details(client, ids, details):
+    fields = dict(details or {}, tmdb_checked=True, updated_at=datetime.utcnow())
+    await client.movies.update_many({"_id": {"$in": ids}}, {"$set": fields})
+    for _id in ids:
+        search_index.update(_id, fields)
+
+async def tmdb_backfill_loop(client):
+    # Purane docs (bina tmdb_checked) ko dheere-dheere enrich karo; ek title group = ek TMDB lookup
+    while True:
+        try:
+            docs = await client.movies.find(
+                {"tmdb_checked": {"$exists": False}}, {"title": 1, "norm_title": 1, "year": 1, "original_title": 1}
+            ).to_list(length=TMDB_BACKFILL_BATCH)
+            if not docs:
+                await asyncio.sleep(TMDB_BACKFILL_INTERVAL)
+                continue
+
+            groups = defaultdict(list)
+            for doc in docs:
+                year = doc.get("year") or parse_caption_title(doc.get("original_title") or doc.get("title", ""))[1]
+                groups[(doc_norm_title(doc), year)].append(doc)
+
+            failed = []
+
+            async def enrich(key):
+                try:
+                    details = await fetch_tmdb_details(groups[key][0].get("title", ""), key[1])
+                except TMDBUnavailable as e:
+                    # tmdb_checked set nahi hoga, agle round me ye group phir aayega
+                    failed.append(e)
+                    return
+                await save_tmdb_details(client, [doc["_id"] for doc in groups[key]], details)
+
+            await run_pool(list(groups), enrich, TMDB_BACKFILL_CONCURRENCY)
+            if failed:
+                logger.warning(f"TMDB Backfill: {len(failed)}/{len(groups)} groups failed ({failed[0]}), retry later")
+                await asyncio.sleep(TMDB_BACKFILL_RETRY)
+            else:
+                await asyncio.sleep(TMDB_BACKFILL_PAUSE)
+        except Exception as e:
+            logger.error(f"TMDB Backfill Error: {e}")
+            await asyncio.sleep(TMDB_BACKFILL_INTERVAL)
+
+# ================= BULK CATALOG IMPORT =================
+# Storage channel history ko message-id pages me padhte hain (bots get_chat_history use nahi kar sakte)
+async def enrich_movie_docs(docs):
+    # Ek hi title ke saare files ke liye ek TMDB lookup, IMPORT_TMDB_CONCURRENCY ki limit me
+    groups = defaultdict(list)
+    for doc in docs:
+        groups[(doc["norm_title"], doc["year"])].append(doc)
+
+    async def enrich(key):
+        try:
+            details = await fetch_tmdb_details(groups[key][0]["title"], key[1])
+        except TMDBUnavailable:
+            # Bina tmdb_checked ke save honge, backfill loop baad me enrich karega
+            return
+        for doc in groups[key]:
+            doc.update(details or {})
+            doc["tmdb_checked"] = True
+
+    await run_pool(list(groups), enrich, IMPORT_TMDB_CONCURRENCY)
+
+async def import_page(client, job, seen):
+    start = job["next_id"]
+    end = min(start + IMPORT_PAGE_SIZE - 1, job["last_id"])
+    msgs = await flood_retry(lambda: client.get_messages(job["chat_id"], list(range(start, end + 1))))
+
+    docs = []
+    for m in msgs:
+        if not m or m.empty:
+            continue
+        file = m.video or m.document
+        if not file or file.file_unique_id in seen:
+            continue
+        seen.add(file.file_unique_id)
+        docs.append(make_movie_doc(m, file))
+
+    if docs:
+        # file_unique_id ke saath file_id bhi: jin purane docs ka unique id decode nahi hua wo bhi pakde jayein
+        existing = set(await client.movies.distinct("file_unique_id", {"file_unique_id": {"$in": [d["file_unique_id"] for d in docs]}}))
+        existing_ids = set(await client.movies.distinct("file_id", {"file_id": {"$in": [d["file_id"] for d in docs]}}))
+        fresh = [d for d in docs if d["file_unique_id"] not in existing and d["file_id"] not in existing_ids]
+        job["skipped"] += len(docs) - len(fresh)
+        docs = fresh
+
+    if docs:
+        await enrich_movie_docs(docs)
+        for doc in docs:
+            doc["updated_at"] = datetime.utcnow()
+        await client.movies.insert_many(docs, ordered=False)
+        if "updates" in SERVICES:
+            for doc in docs:
+                search_index.add(doc)
+        job["imported"] += len(docs)
+
+    job["next_id"] = end + 1
+
+def import_report(job, finished):
+    header = "✅ **Import Complete!**" if finished else "📥 **Import chal raha hai...**"
+    return (
+        f"{header}\n\n"
+        f"📡 **Channel:** `{job['chat_id']}`\n"
+        f"🔢 **Progress:** `{min(job['next_id'] - 1, job['last_id'])}/{job['last_id']}`\n"
+        f"🎬 **Imported:** `{job['imported']}`\n"
+        f"♻️ **Already in DB:** `{job['skipped']}`"
+    )
+
+active_imports = set()
+
+async def run_import(client, job_id):
+    if job_id in active_imports:
+        return
+    job = await client.imports.find_one({"_id": job_id})
+    if not job or job.get("status") != "running":
+        return
+
+    active_imports.add(job_id)
+    seen = set()
+    try:
+        while True:
+            while job["next_id"] <= job["last_id"]:
+                await import_page(client, job, seen)
+                latest = await client.imports.find_one_and_update({"_id": job_id}, {"$set": {
+                    "next_id": job["next_id"],
+                    "imported": job["imported"],
+                    "skipped": job["skipped"],
+                    "updated_at": datetime.now()
+                }}, return_document=ReturnDocument.AFTER)
+                # Beech me /import ne last_id badhaya ho ya naya status message diya ho to wahi follow karo
+                if latest:
+                    job.update({k: latest[k] for k in ("last_id", "status_chat_id", "status_msg_id")})
+                try:
+                    await client.edit_message_text(job["status_chat_id"], job["status_msg_id"], import_report(job, False))
+                except Exception:
+                    pass
+
+            # Sirf tab done jab last_id abhi bhi wahi hai; warna badhi hui range ke liye loop chalta rahe
+            latest = await client.imports.find_one_and_update(
+                {"_id": job_id, "last_id": job["last_id"]},
+                {"$set": {"status": "done", "finished_at": datetime.now()}},
+                return_document=ReturnDocument.AFTER
+            )
+            if latest:
+                break
+            latest = await client.imports.find_one({"_id": job_id})
+            job.update({k: latest[k] for k in ("last_id", "status_chat_id", "status_msg_id")})
+    except Exception as e:
+        # Job queue checkpoint (next_id) se dobara try karegi
+        logger.error(f"Import {job_id} Error: {e}")
+        raise
+    finally:
+        active_imports.discard(job_id)
+
+    job.update({k: latest[k] for k in ("status_chat_id", "status_msg_id")})
+    try:
+        await client.edit_message_text(job["status_chat_id"], job["status_msg_id"], import_report(job, True))
+    except Exception as e:
+        logger.error(f"Import Report Error: {e}")
+
+# ================= INGEST PIPELINE =================
+# parse (handler) -> persist -> enrich -> announce -> notify, har stage ke beech bounded queue
+async def edit_status(client, items, text):
+    # status = (chat_id, message_id); ingest job kisi doosre process me bhi chal sakta hai
+    for item in items:
+        if item["status"]:
+            try:
+                await client.edit_message_text(*item["status"], text)
+            except Exception:
+                pass
+
+class IngestPipeline:
+    def __init__(self):
+        self.queues = {name: asyncio.Queue(maxsize=INGEST_QUEUE_SIZE) for name in ("persist", "enrich", "announce", "notify")}
+
+    def start(self, client):
+        tasks = [asyncio.create_task(self.persist_loop(client))]
+        tasks += [asyncio.create_task(self.stage_loop("enrich", self.enrich, client)) for _ in range(INGEST_ENRICH_WORKERS)]
+        tasks.append(asyncio.create_task(self.stage_loop("announce", self.announce, client)))
+        tasks.append(asyncio.create_task(self.stage_loop("notify", self.notify, client)))
+        return tasks
+
+    async def submit(self, item):
+        await self.queues["persist"].put(item)
+
+    async def stage_loop(self, name, handler, client):
+        queue = self.queues[name]
+        while True:
+            group = await queue.get()
+            try:
+                await handler(client, group)
+            except Exception as e:
+                logger.error(f"Ingest {name} Error: {e}")
+            finally:
+                queue.task_done()
+
+    async def next_batch(self):
+        # Micro-batch: pehla item aate hi INGEST_BATCH_WAIT tak aur items jama karo
+        queue = self.queues["persist"]
+        loop = asyncio.get_running_loop()
+        batch = [await queue.get()]
+        deadline = loop.time() + INGEST_BATCH_WAIT
+        while len(batch) < INGEST_BATCH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def persist_loop(self, client):
+        queue = self.queues["persist"]
+        while True:
+            batch = await self.next_batch()
+            try:
+                await self.persist(client, batch)
+            except Exception as e:
+                logger.error(f"Ingest persist Error: {e}")
+                resolve_persisted(batch, e)
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
+    async def persist(self, client, batch):
+        docs = [item["doc"] for item in batch]
+        keys = list({doc["norm_title"] for doc in docs})
+        ids = [doc["_id"] for doc in docs]
+        already_posted = set(await client.movies.distinct("norm_title", {"norm_title": {"$in": keys}, "_id": {"$nin": ids}}))
+
+        now = datetime.utcnow()
+        for doc in docs:
+            doc["updated_at"] = now
+        try:
+            await client.movies.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            # Job retry par pehle se likhe docs duplicate key dete hain, wo theek hai
+            if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                raise
+        resolve_persisted(batch)
+        if "updates" in SERVICES:
+            for doc in docs:
+                search_index.add(doc)
+        if SHORTLINK_ENABLED and SHORTLINK_PREWARM:
+            asyncio.create_task(get_file_links(chat_meta.username(), [doc["_id"] for doc in docs]))
+
+        # Ek hi title ke episodes ek group: ek TMDB lookup aur ek channel post
+        groups = defaultdict(list)
+        for item in batch:
+            groups[item["doc"]["norm_title"]].append(item)
+
+        for key, items in groups.items():
+            duplicate = key in already_posted
+            if duplicate:
+                await edit_status(client, items, f"📁 File DB me Add ho gayi!\n⚠️ **Duplicate Poster Skipped:** `{items[0]['doc']['title']}` ka poster pehle se hai.")
+            await self.queues["enrich"].put({"key": key, "items": items, "details": None, "announce": not duplicate})
+
+    async def enrich(self, client, group):
+        first = group["items"][0]["doc"]
+        # Duplicate title ka metadata catalog se copy, TMDB call nahi
+        known = await client.movies.find_one({"norm_title": group["key"], "tmdb_checked": True}, TMDB_FIELDS_PROJECTION)
+        details, checked = None, True
+        if known:
+            details = {k: known[k] for k in TMDB_FIELDS if k in known} or None
+        else:
+            try:
+                details = await fetch_tmdb_details(first["title"], first["year"])
+            except TMDBUnavailable as e:
+                # Failure ko "no match" mat maano; tmdb_checked khali rahega to backfill dobara try karega
+                logger.warning(f"TMDB unavailable for {first['title']}: {e}")
+                checked = False
+        group["details"] = details
+        if checked:
+            await save_tmdb_details(client, [item["doc"]["_id"] for item in group["items"]], details)
+        if group["announce"]:
+            await self.queues["announce"].put(group)
+
+    async def announce(self, client, group):
+        items = group["items"]
+        first = items[0]["doc"]
+        details = group["details"] or {}
+        more_files = f" (+{len(items) - 1} more)" if len(items) > 1 else ""
+
+        caption_text = (
+            f"🎬 **EXCLUSIVE MOVIE DROP** 🎬\n\n"
+            f"📌 **TITLE :** `{details.get('tmdb_title') or first['title']}`\n"
+            f"📅 **RELEASE DATE :** {details.get('release_date', 'N/A')}\n"
+            f"⭐ **RATING :** {details.get('rating', 'N/A')} / 10\n"
+            f"📁 **FILE NAME :** `{first['original_title']}`{more_files}\n\n"
+            f"👇 **DOWNLOAD HERE** 👇\n"
+            f"Movie ka naam copy karke search group me likh dena he."
+        )
+
+        buttons = InlineKeyboardMarkup([
+            [InlineKeyboardButton("🔍 GET MOVIE HERE 🔍", url=chat_meta.group_link)]
+        ])
+
+        target_channel = FSUB_CHANNEL or "@Movies2026Cinema"
+
+        try:
+            if details.get("poster_path"):
+                await flood_retry(lambda: send_poster(client, target_channel, details["poster_path"], size="w342", caption=caption_text, reply_markup=buttons))
+            else:
+                await flood_retry(lambda: client.send_message(target_channel, text=caption_text, reply_markup=buttons))
+
+            await edit_status(client, items, "✅ Database Updated & Channel Poster Posted!")
+        except Exception as e:
+            logger.error(f"Auto Poster Error: {e}")
+            chat_meta.invalidate()
+            await edit_status(client, items, f"❌ Channel Post Error: `{e}`")
+
+        await self.queues["notify"].put(group)
+
+    async def notify(self, client, group):
+        await job_queue.enqueue(client, "notify", {"title": group["key"], "caption": group["items"][0]["doc"]["original_title"]})
+
+def resolve_persisted(batch, error=None):
+    # Ingest job tabhi "done" hota hai jab uska doc Mongo me likh chuka ho
+    for item in batch:
+        persisted = item.get("persisted")
+        if persisted and not persisted.done():
+            if error:
+                persisted.set_exception(error)
+            else:
+                persisted.set_result(True)
+
+ingest_pipeline = IngestPipeline()
+
+# ================= SEARCH COALESCING =================
+# Release ke time same query ek saath aaye to ek hi search/poster/markup sab users share karte hain
+search_reply_cache = TTLCache(RESULT_CACHE_SIZE, SEARCH_COALESCE_TTL)
+search_flight = SingleFlight()
+
+async def compute_search_reply(client, query):
+    try:
+        results = await asyncio.wait_for(smart_db_search(client, query), timeout=5.0)
+    except Exception:
+        results = []
+
+    reply = {"results": results, "poster": None, "markup": None}
+    if results:
+        poster = catalog_poster(results)
+        if poster is False:
+            poster = await get_poster(query)
+        ids = [doc["_id"] for doc in results]
+        token = cache_search_results(query, ids)
+        reply["poster"] = poster
+        reply["markup"] = await get_search_buttons(token, query, ids, offset=0)
+
+    search_reply_cache.set(query, reply)
+    return reply
+
+async def coalesced_search(client, query):
+    reply = search_reply_cache.get(query)
+    if reply is not None:
+        return reply
+    return await search_flight.do(query, lambda: compute_search_reply(client, query))
+
+# ================= USER REGISTRY =================
+# /start par har baar Mongo upsert nahi: known users memory me (bounded LRU), naye ids batch me flush
+class UserRegistry:
+    def __init__(self):
+        self.known = OrderedDict()
+        self.pending = set()
+
+    def __len__(self):
+        return len(self.known)
+
+    async def load(self, users):
+        # Sabse naye KNOWN_USERS_MAX users; purane wale LRU ke aage (pehle evict) rahte hain
+        ids = []
+        async for doc in users.find({}, {"user_id": 1, "_id": 0}).sort("_id", -1).limit(KNOWN_USERS_MAX):
+            if doc.get("user_id") is not None:
+                ids.append(doc["user_id"])
+        expires = time.monotonic() + KNOWN_USER_TTL
+        self.known = OrderedDict((user_id, expires) for user_id in reversed(ids))
+
+    def seen(self, user_id):
+        # TTL: doosra process (broadcast worker) user delete kar de to bhi kuch der me dobara likh dete hain
+        now = time.monotonic()
+        expires = self.known.get(user_id)
+        if expires is not None and expires > now:
+            self.known.move_to_end(user_id)
+            return
+        self.known[user_id] = now + KNOWN_USER_TTL
+        self.known.move_to_end(user_id)
+        while len(self.known) > KNOWN_USERS_MAX:
+            self.known.popitem(last=False)
+        self.pending.add(user_id)
+
+    def forget(self, user_ids):
+        for user_id in user_ids:
+            self.known.pop(user_id, None)
+
+    async def flush(self, users):
+        while self.pending:
+            batch = list(self.pending)[:USER_FLUSH_BATCH]
+            self.pending.difference_update(batch)
+            try:
+                await users.bulk_write([UpdateOne({"user_id": uid}, {"$setOnInsert": {"user_id": uid}}, upsert=True) for uid in batch], ordered=False)
+            except BulkWriteError as e:
+                # Unique index par race (doosre process ne pehle likh diya) theek hai
+                if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                    self.pending.update(batch)
+                    logger.error(f"User Flush Error: {e}")
+                    return
+            except Exception as e:
+                self.pending.update(batch)
+                logger.error(f"User Flush Error: {e}")
+                return
+            except asyncio.CancelledError:
+                # Shutdown par cancel: batch kho na jaye, stop() ka final flush likh dega
+                self.pending.update(batch)
+                raise
+
+    async def flush_loop(self, users):
+        while True:
+            await asyncio.sleep(USER_FLUSH_INTERVAL)
+            await self.flush(users)
+
+user_registry = UserRegistry()
+
+# ================= JOB QUEUE =================
+# Mongo "jobs" collection: roles ke beech durable kaam; lease expire ho to koi aur worker utha leta hai
+class JobQueue:
+    def __init__(self):
+        self.owner = f"{ROLE}-{os.getpid()}-{secrets.token_hex(3)}"
+        self.wakeups = defaultdict(asyncio.Event)
+
+    async def enqueue(self, client, kind, payload, job_id=None):
+        now = datetime.utcnow()
+        doc = {"kind": kind, "payload": payload, "status": "pending", "attempts": 0, "run_after": now, "created_at": now}
+        if job_id is None:
+            await client.jobs.insert_one(doc)
+        else:
+            # Keyed job: pending/running ho to wahi rehta hai, khatam ho chuka ho to dobara arm
+            try:
+                await client.jobs.update_one(
+                    {"_id": job_id, "status": {"$in": ["done", "failed"]}},
+                    {"$set": doc, "$unset": {"finished_at": "", "error": "", "owner": "", "lease_until": ""}},
+                    upsert=True
+                )
+            except DuplicateKeyError:
+                return False
+        self.wakeups[kind].set()
+        return True
+
+    async def claim(self, client, kind):
+        now = datetime.utcnow()
+        return await client.jobs.find_one_and_update(
+            {"kind": kind, "$or": [
+                {"status": "pending", "run_after": {"$lte": now}},
+                {"status": "running", "lease_until": {"$lt": now}}
+            ]},
+            {"$set": {"status": "running", "owner": self.owner, "lease_until": now + timedelta(seconds=JOB_LEASE)}, "$inc": {"attempts": 1}},
+            sort=[("run_after", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def hold_lease(self, client, name, seconds):
+        # Singleton loops ke liye lease: jiske paas hai wahi renew kare, expire hone par koi bhi le le
+        now = datetime.utcnow()
+        try:
+            doc = await client.jobs.find_one_and_update(
+                {"_id": f"lease:{name}", "$or": [{"owner": self.owner}, {"lease_until": {"$lt": now}}]},
+                {"$set": {"owner": self.owner, "lease_until": now + timedelta(seconds=seconds)}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Lease doc hai par kisi aur process ke paas
+            return False
+        return doc is not None
+
+    async def keep_lease(self, client, job_id):
+        # Lambe jobs (broadcast/import) ke liye lease aage badhate raho
+        while True:
+            await asyncio.sleep(JOB_LEASE / 3)
+            try:
+                await client.jobs.update_one(
+                    {"_id": job_id, "owner": self.owner},
+                    {"$set": {"lease_until": datetime.utcnow() + timedelta(seconds=JOB_LEASE)}}
+                )
+            except Exception as e:
+                logger.error(f"Job Lease Error ({job_id}): {e}")
+
+    async def execute(self, client, job, handler):
+        lease = asyncio.create_task(self.keep_lease(client, job["_id"]))
+        mine = {"_id": job["_id"], "owner": self.owner}
+        try:
+            await handler(client, job["payload"])
+            await client.jobs.update_one(mine, {"$set": {"status": "done", "finished_at": datetime.utcnow()}})
+            metrics.inc("bot_jobs_total", kind=job["kind"], result="done")
+        except Exception as e:
+            logger.error(f"Job {job['kind']} {job['_id']} Error (attempt {job['attempts']}): {e}")
+            if job["attempts"] >= JOB_MAX_ATTEMPTS:
+                update = {"status": "failed", "error": str(e), "finished_at": datetime.utcnow()}
+                metrics.inc("bot_jobs_total", kind=job["kind"], result="failed")
+            else:
+                backoff = min(300, 5 * 2 ** job["attempts"])
+                update = {"status": "pending", "error": str(e), "run_after": datetime.utcnow() + timedelta(seconds=backoff)}
+                metrics.inc("bot_jobs_total", kind=job["kind"], result="retry")
+            try:
+                await client.jobs.update_one(mine, {"$set": update})
+            except Exception as e:
+                logger.error(f"Job Update Error ({job['_id']}): {e}")
+        finally:
+            lease.cancel()
+
+    async def run(self, client, kind, handler, concurrency):
+        slots = asyncio.Semaphore(concurrency)
+        wake = self.wakeups[kind]
+        while True:
+            await slots.acquire()
+            wake.clear()
+            try:
+                job = await self.claim(client, kind)
+            except Exception as e:
+                logger.error(f"Job Claim Error ({kind}): {e}")
+                job = None
+            if job is None:
+                slots.release()
+                # Isi process ka enqueue turant jagata hai, doosre process ke jobs poll se milte hain
+                try:
+                    await asyncio.wait_for(wake.wait(), JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            task = asyncio.create_task(self.execute(client, job, handler))
+            task.add_done_callback(lambda _: slots.release())
+
+job_queue = JobQueue()
+
+async def handle_ingest_job(client, payload):
+    persisted = asyncio.get_running_loop().create_future()
+    # Pipeline queue full ho to yahin ruk jate hain (backpressure), TMDB/channel par burst nahi jata
+    await ingest_pipeline.submit({"doc": payload["doc"], "status": payload.get("status"), "persisted": persisted})
+    await persisted
+
+async def handle_import_job(client, payload):
+    await run_import(client, payload["import_id"])
+
+async def handle_broadcast_job(client, payload):
+    await run_broadcast(client, payload["broadcast_id"])
+
+async def handle_notify_job(client, payload):
+    if "updates" not in SERVICES:
+        # Requests interactive process me aati hain; match se pehle sirf nayi wali uthao
+        await request_index.sync(client.requests)
+    await notify_requesters(client, payload["title"], payload["caption"])
+
+async def enqueue_broadcast(client, broadcast_id):
+    return await job_queue.enqueue(client, "broadcast", {"broadcast_id": broadcast_id}, job_id=f"broadcast:{broadcast_id}")
+
+async def enqueue_import(client, import_id):
+    return await job_queue.enqueue(client, "import", {"import_id": import_id}, job_id=f"import:{import_id}")
+
+async def catalog_sync_loop(client, since):
+    # Split deploy: ingest process naye/enriched docs likhta hai, search index unhe updated_at se uthata hai
+    while True:
+        await asyncio.sleep(CATALOG_SYNC_INTERVAL)
+        try:
+            cutoff = datetime.utcnow()
+            async for doc in client.movies.find({"updated_at": {"$gte": since}}):
+                search_index.add(doc)
+            # Thoda overlap: clock skew aur der se commit hue batches ke liye (add idempotent hai)
+            since = cutoff - timedelta(seconds=30)
+        except Exception as e:
+            logger.error(f"Catalog Sync Error: {e}")
+
+def start_services(client, sync_from):
+    tasks = []
+    if "ingest" in SERVICES:
+        tasks += ingest_pipeline.start(client)
+        tasks.append(asyncio.create_task(job_queue.run(client, "ingest", handle_ingest_job, INGEST_BATCH_SIZE)))
+        tasks.append(asyncio.create_task(job_queue.run(client, "import", handle_import_job, 1)))
+        if TMDB_API_KEY:
+            tasks.append(asyncio.create_task(tmdb_backfill_loop(client)))
+    if "workers" in SERVICES:
+        tasks.append(asyncio.create_task(autodelete_loop(client)))
+        tasks.append(asyncio.create_task(job_queue.run(client, "broadcast", handle_broadcast_job, 1)))
+        tasks.append(asyncio.create_task(job_queue.run(client, "notify", handle_notify_job, 2)))
+    if "updates" in SERVICES:
+        tasks.append(asyncio.create_task(user_registry.flush_loop(client.users)))
+        # ROLE=all ke saath alag ingest process bhi ho sakta hai, isliye har updates process sync kare
+        tasks.append(asyncio.create_task(catalog_sync_loop(client, sync_from)))
+    return tasks
 
 # ================= ALL ADMIN COMMAND HANDLERS =================
 
@@ -389,14 +2377,17 @@ async def delete_single_request_cmd(client, msg):
         return await msg.reply("Usage:\n`/delreq movie_name`")
     
     query = clean_name(" ".join(msg.command[1:]))
-    res = await client.requests.delete_many({
-        "query": {"$regex": query, "$options": "i"}
-    })
+    if not query:
+        return await msg.reply("Usage:\n`/delreq movie_name`")
+    matched = [q for q in request_index.all() if query in q]
+    res = await client.requests.delete_many({"query": {"$in": matched}})
+    request_index.remove(matched)
     await msg.reply(f"🗑️ Cleaned: Deleted `{res.deleted_count}` pending request(s) matching `{query}`.")
 
 @app.on_message(filters.command("clearreq") & filters.user(ADMIN_IDS))
 async def clear_all_requests_cmd(client, msg):
     res = await client.requests.delete_many({})
+    request_index.clear()
     await msg.reply(f"🗑️ MongoDB Cleaned! Removed all `{res.deleted_count}` pending requests.")
 
 @app.on_message(filters.command("shortlink") & filters.user(ADMIN_IDS))
@@ -417,9 +2408,12 @@ async def delete_movie_cmd(client, msg):
     if len(msg.command) < 2:
         return await msg.reply("Usage:\n/del movie_name")
     query = clean_name(" ".join(msg.command[1:]))
-    result = await client.movies.delete_many({
-        "title": {"$regex": query, "$options": "i"}
-    })
+    if not query:
+        return await msg.reply("Usage:\n/del movie_name")
+    ids = search_index.ids_containing(query)
+    result = await client.movies.delete_many({"_id": {"$in": ids}})
+    search_index.remove(ids)
+    await forget_shortlinks(ids)
     await msg.reply(f"🗑️ Deleted: {result.deleted_count} movie(s).")
 
 @app.on_message(filters.command(["broadcast", "sms"]) & filters.user(ADMIN_IDS))
@@ -428,48 +2422,88 @@ async def broadcast_cmd(client, msg):
         return await msg.reply("⚠️ Broadcast bhejne ke liye kisi message ko reply karein `/broadcast` ya `/sms` se.")
         
     status = await msg.reply("📢 **Broadcast shuru ho raha hai...**")
-    users = await client.users.find({}).to_list(length=100000)
-    
-    total = len(users)
-    success = 0
-    blocked = 0
-    failed = 0
-    
-    for u in users:
-        uid = u.get("user_id")
-        if not uid: continue
-        try:
-            await msg.reply_to_message.copy(uid)
-            success += 1
-            await asyncio.sleep(0.05)
-        except (UserIsBlocked, InputUserDeactivated):
-            blocked += 1
-        except Exception:
-            failed += 1
-            
-    report = (
-        f"📊 **Broadcast Finished Report**\n\n"
-        f"👥 **Total Users:** `{total}`\n"
-        f"✅ **Sent Successfully:** `{success}`\n"
-        f"🚫 **Blocked/Deleted:** `{blocked}`\n"
-        f"❌ **Failed:** `{failed}`"
-    )
-    await status.edit(report)
+    job = {
+        "from_chat_id": msg.chat.id,
+        "message_id": msg.reply_to_message.id,
+        "status_chat_id": status.chat.id,
+        "status_msg_id": status.id,
+        "status": "running",
+        "last_id": None,
+        "success": 0,
+        "blocked": 0,
+        "failed": 0,
+        "started_at": datetime.now()
+    }
+    await client.broadcasts.insert_one(job)
+    await enqueue_broadcast(client, job["_id"])
+
+@app.on_message(filters.command("import") & filters.user(ADMIN_IDS))
+async def import_cmd(client, msg):
+    if len(msg.command) < 3 or not msg.command[2].isdigit():
+        return await msg.reply("Usage:\n`/import channel_id last_msg_id [first_msg_id]`\n\nAdha-chala import wahi se resume hota hai.")
+
+    chat_id = int(msg.command[1]) if msg.command[1].lstrip("-").isdigit() else msg.command[1]
+    job_id = str(chat_id)
+    job = await client.imports.find_one({"_id": job_id})
+    status = await msg.reply("📥 **Import shuru ho raha hai...**")
+
+    if job and job.get("status") == "running":
+        await client.imports.update_one({"_id": job_id}, {"$set": {
+            "last_id": max(job["last_id"], int(msg.command[2])),
+            "status_chat_id": status.chat.id,
+            "status_msg_id": status.id
+        }})
+    else:
+        # Khatam ho chuka import: first_id na diya ho to pichhle checkpoint se aage, shuru se nahi
+        if len(msg.command) > 3 and msg.command[3].isdigit():
+            first_id = int(msg.command[3])
+        else:
+            first_id = job["next_id"] if job else 1
+        await client.imports.replace_one({"_id": job_id}, {
+            "_id": job_id,
+            "chat_id": chat_id,
+            "next_id": first_id,
+            "last_id": int(msg.command[2]),
+            "imported": 0,
+            "skipped": 0,
+            "status": "running",
+            "status_chat_id": status.chat.id,
+            "status_msg_id": status.id,
+            "started_at": datetime.now()
+        }, upsert=True)
+
+    await enqueue_import(client, job_id)
+
+@app.on_message(filters.command("debug") & filters.user(ADMIN_IDS))
+async def debug_cmd(client, msg):
+    # /debug | /debug tasks | /debug loop | /debug profile 10
+    args = msg.command[1:]
+    view = args[0].lower() if args else "all"
+    if view == "profile":
+        seconds = int(args[1]) if len(args) > 1 and args[1].isdigit() else 5
+        sts = await msg.reply(f"⏳ {min(seconds, DEBUG_PROFILE_MAX)}s profile chal raha hai...")
+        text = await run_profile(seconds, top=12)
+        return await sts.edit(f"```\n{text[:3900]}\n```")
+    if view == "tasks":
+        text = task_summary()
+    elif view == "loop":
+        text = loop_monitor.summary()
+    else:
+        text = f"{task_summary(top=10)}\n\n{loop_monitor.summary()}"
+    await msg.reply(f"```\n{text[:3900]}\n```")
 
 # ================= CALLBACK QUERY HANDLER (PAGINATION) =================
 @app.on_callback_query(filters.regex(r"^page_"))
 async def page_callback(client, cb):
     try:
-        await cb.answer()
-        data = cb.data.split("_")
-        offset = int(data[1])
-        query = unquote("_".join(data[2:]))
-
-        results = await smart_db_search(client, query)
-        if not results:
-            return await cb.answer("❌ Koi result nahi mila!", show_alert=True)
+        _, offset, token = cb.data.split("_", 2)
+        cached = result_cache.get(token)
+        if not cached:
+            return await cb.answer("⌛ Ye search expire ho gaya, dobara search karein!", show_alert=True)
 
-        reply_markup = await get_search_buttons(query, results, offset=offset)
+        await cb.answer()
+        query, ids = cached
+        reply_markup = await get_search_buttons(token, query, ids, offset=int(offset))
         await cb.message.edit_reply_markup(reply_markup=reply_markup)
     except Exception as e:
         logger.error(f"Page Callback Error: {e}")
@@ -478,17 +2512,15 @@ async def page_callback(client, cb):
 
 @app.on_message(filters.command("start") & filters.private)
 async def start_cmd(client, msg):
-    await client.users.update_one({"user_id": msg.from_user.id}, {"$set": {"user_id": msg.from_user.id}}, upsert=True)
+    user_registry.seen(msg.from_user.id)
     data = msg.command[1] if len(msg.command) > 1 else ""
 
     try:
         await client.get_chat_member(FSUB_CHANNEL, msg.from_user.id)
     except UserNotParticipant:
-        invite = (await client.get_chat(FSUB_CHANNEL)).invite_link or MAIN_CHANNEL_LINK
-        me = await client.get_me()
-        buttons = [[InlineKeyboardButton("📢 JOIN CHANNEL", url=invite)]]
+        buttons = [[InlineKeyboardButton("📢 JOIN CHANNEL", url=chat_meta.fsub_invite)]]
         if data:
-            try_again_link = f"https://t.me/{me.username}?start={data}"
+            try_again_link = f"https://t.me/{chat_meta.username()}?start={data}"
             buttons.append([InlineKeyboardButton("🔄 TRY AGAIN / VERIFY 🔄", url=try_again_link)])
         btn = InlineKeyboardMarkup(buttons)
         return await msg.reply("❌ Pehle channel join karein!", reply_markup=btn)
@@ -496,15 +2528,7 @@ async def start_cmd(client, msg):
         pass
 
     if not data:
-        group_link = MAIN_CHANNEL_LINK
-        if SEARCH_CHAT and SEARCH_CHAT != 0:
-            try:
-                search_group = await client.get_chat(SEARCH_CHAT)
-                group_link = search_group.invite_link or (f"https://t.me/{search_group.username}" if search_group.username else MAIN_CHANNEL_LINK)
-            except Exception:
-                group_link = MAIN_CHANNEL_LINK
-
-        btn = InlineKeyboardMarkup([[InlineKeyboardButton("🔍 GO TO SEARCH GROUP 🔍", url=group_link)]])
+        btn = InlineKeyboardMarkup([[InlineKeyboardButton("🔍 GO TO SEARCH GROUP 🔍", url=chat_meta.group_link)]])
         return await msg.reply(
             "👋 **Namaste!**\n\nMovies search karne ke liye niche diye gaye button par click karke hamare **Search Group** me jayein.",
             reply_markup=btn
@@ -513,25 +2537,16 @@ async def start_cmd(client, msg):
     if data.startswith("file_"):
         res = await client.movies.find_one({"_id": ObjectId(data.split("_")[1])})
         if res:
-            raw_title = res.get('original_title', res.get('title', 'Movie'))
-            clean_title = str(raw_title).split("\n")[0].split("JOIN")[0].replace("@Movies2026Cinema", "").strip()
-            safe_title = clean_title.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-            
-            cap = (
-                f"<blockquote><a href='https://t.me/Movies2026Cinema'><b>{safe_title}</b></a>\n"
-                f"<b>JOIN ❤️: @Movies2026Cinema</b></blockquote>"
-            )
-
             sf = await client.send_cached_media(
                 chat_id=msg.chat.id, 
                 file_id=res["file_id"], 
-                caption=cap,
+                caption=file_caption(res),
                 parse_mode=enums.ParseMode.HTML
             )
             warn_msg = await msg.reply_text(
                 "⚠️ **DHYAN DEN:** Is file ko turant apne **Saved Messages** ya kisi doosri jagah **Forward** karke rakh lein, ye 5 minute mein delete ho jayegi!"
             )
-            asyncio.create_task(delete_after_delay([sf, warn_msg], 300))
+            await schedule_delete(client, [sf, warn_msg], 300)
 
     elif data.startswith("all_"):
         try:
@@ -546,44 +2561,17 @@ async def start_cmd(client, msg):
             return await msg.reply("❌ Files nahi mili!")
 
         sts = await msg.reply(f"🔍 Found {len(results)} files. Sending...")
-        sent_messages = []
-        for res in results:
-            try:
-                raw_title = res.get('original_title', res.get('title', 'Movie'))
-                clean_title = str(raw_title).split("\n")[0].split("JOIN")[0].replace("@Movies2026Cinema", "").strip()
-                safe_title = clean_title.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-                
-                cap = (
-                    f"<blockquote><a href='https://t.me/Movies2026Cinema'><b>{safe_title}</b></a>\n"
-                    f"<b>JOIN ❤️: @Movies2026Cinema</b></blockquote>"
-                )
-                poster = res.get("poster") or res.get("poster_url")
-                if poster:
-                    m = await client.send_photo(msg.chat.id, photo=poster, caption=cap, parse_mode=enums.ParseMode.HTML)
-                else:
-                    m = await client.send_cached_media(msg.chat.id, res["file_id"], caption=cap, parse_mode=enums.ParseMode.HTML)
-                sent_messages.append(m)
-                await asyncio.sleep(1.2)
-            except Exception:
-                pass
+        sent_messages = await send_files_batched(client, msg.chat.id, results, sts)
 
         warn_sts = await sts.edit(
             "✅ **Batch Complete!**\n\n"
             "⚠️ **DHYAN DEN:** Sabhi files 5 minute mein delete ho jayengi! Inhe turant apne **Saved Messages** mein forward kar lein."
         )
-        asyncio.create_task(delete_after_delay(sent_messages + [warn_sts], 300))
+        await schedule_delete(client, sent_messages + [warn_sts], 300)
             
 @app.on_message(filters.private & filters.text & ~filters.regex(r"^/"))
 async def pm_text_handler(client, msg):
-    group_link = MAIN_CHANNEL_LINK
-    if SEARCH_CHAT and SEARCH_CHAT != 0:
-        try:
-            search_group = await client.get_chat(SEARCH_CHAT)
-            group_link = search_group.invite_link or (f"https://t.me/{search_group.username}" if search_group.username else MAIN_CHANNEL_LINK)
-        except Exception:
-            group_link = MAIN_CHANNEL_LINK
-
-    btn = InlineKeyboardMarkup([[InlineKeyboardButton("🔍 GO TO SEARCH GROUP 🔍", url=group_link)]])
+    btn = InlineKeyboardMarkup([[InlineKeyboardButton("🔍 GO TO SEARCH GROUP 🔍", url=chat_meta.group_link)]])
     await msg.reply(
         "👋 **Namaste!**\n\n"
         "Movies search karne ke liye niche diye gaye button par click karke hamare **Search Group** me jayein aur wahan movie ka naam type karein.",
@@ -611,11 +2599,12 @@ async def search_movie(client, msg):
         except Exception:
             return d_str
 
-    results = []
     try:
-        results = await asyncio.wait_for(smart_db_search(client, msg.text), timeout=5.0)
-    except Exception:
-        results = []
+        reply = await coalesced_search(client, query)
+    except Exception as e:
+        logger.error(f"Search Final Error: {e}")
+        return
+    results = reply["results"]
 
     if not results:
         await client.requests.update_one(
@@ -629,6 +2618,7 @@ async def search_movie(client, msg):
             }},
             upsert=True
         )
+        request_index.add(query)
 
         asyncio.create_task(notify_admins_about_request(client, user_name, user_id, user_mention, msg.text))
 
@@ -657,16 +2647,16 @@ async def search_movie(client, msg):
                 pass
 
             res_msg = None
-            if upcoming_info.get('poster'):
+            if upcoming_info.get('poster_path'):
                 try:
-                    res_msg = await client.send_photo(msg.chat.id, photo=upcoming_info['poster'], caption=text)
+                    res_msg = await send_poster(client, msg.chat.id, upcoming_info['poster_path'], caption=text)
                 except Exception:
                     res_msg = await client.send_message(msg.chat.id, text=text)
             else:
                 res_msg = await client.send_message(msg.chat.id, text=text)
 
             if not is_admin and res_msg:
-                asyncio.create_task(delete_after_delay([res_msg], 300))
+                await schedule_delete(client, [res_msg], 300)
             return
 
         try:
@@ -683,12 +2673,12 @@ async def search_movie(client, msg):
         )
 
         if not is_admin:
-            asyncio.create_task(delete_after_delay([req_msg, msg], 60))
+            await schedule_delete(client, [req_msg, msg], 60)
         return
 
     try:
-        poster = await get_poster(query)
-        markup = await get_search_buttons(query, results, offset=0)
+        poster = reply["poster"]
+        markup = reply["markup"]
         
         text = (
             f"🎬 **Results for:** 📌 `{msg.text}`\n"
@@ -698,7 +2688,7 @@ async def search_movie(client, msg):
         
         if poster:
             try:
-                res_msg = await client.send_photo(msg.chat.id, photo=poster, caption=text, reply_markup=markup)
+                res_msg = await send_poster(client, msg.chat.id, poster, caption=text, reply_markup=markup)
             except Exception:
                 res_msg = await client.send_message(msg.chat.id, text=text, reply_markup=markup)
         else:
@@ -714,7 +2704,7 @@ async def search_movie(client, msg):
                 await msg.delete()
             except Exception:
                 pass
-            asyncio.create_task(delete_after_delay([res_msg], 300))
+            await schedule_delete(client, [res_msg], 300)
             
     except Exception as e:
         logger.error(f"Search Final Error: {e}")
@@ -725,161 +2715,72 @@ async def add_to_db(client, msg):
     if not file:
         return
 
-    raw_caption = msg.caption or file.file_name or "Unknown Movie"
-
-    clean_text = raw_caption.replace('.', ' ').replace('_', ' ')
-    year_match = re.search(r'\b(19\d{2}|20\d{2})\b', clean_text)
-    year = year_match.group(1) if year_match else None
-
-    quality_pattern = r'(?i)\b(360p|420p|480p|720p|780p|1080p|1080|2160p|4k|2k|hd|hdr|web-dl|webrip|hdrip|bluray|hdtv|x264|x265|hevc|10bit|aac|ddp|esub|sub|hindi|english|mkv|mp4|avi)\b.*'
-
-    if year:
-        search_title = clean_text.split(year)[0].strip()
-    else:
-        search_title = re.sub(quality_pattern, '', clean_text).strip()
-
-    search_title = re.sub(quality_pattern, '', search_title).strip()
-    if not search_title:
-        search_title = clean_text.strip()
-
-    await client.movies.insert_one({
-        "title": search_title,
-        "original_title": raw_caption,
-        "file_id": file.file_id
-    })
-
-    status_msg = await msg.reply_text(f"📁 File DB me Add ho gayi!\nClean Name: `{search_title}`\n⏳ Checking Duplicate...")
-
-    already_posted = await client.movies.count_documents({
-        "title": {"$regex": f"^{re.escape(search_title)}$", "$options": "i"}
-    })
-
-    if already_posted > 1:
-        await status_msg.edit_text(f"📁 File DB me Add ho gayi!\n⚠️ **Duplicate Poster Skipped:** `{search_title}` ka poster pehle se hai.")
-        return
-
-    group_link = MAIN_CHANNEL_LINK
-    if SEARCH_CHAT and SEARCH_CHAT != 0:
-        try:
-            search_group = await client.get_chat(SEARCH_CHAT)
-            group_link = search_group.invite_link or (f"https://t.me/{search_group.username}" if search_group.username else MAIN_CHANNEL_LINK)
-        except Exception:
-            group_link = MAIN_CHANNEL_LINK
-
-    poster_url = None
-    rel_date = "N/A"
-    rating = "N/A"
-    title_display = search_title
-
-    if TMDB_API_KEY:
-        try:
-            encoded_title = search_title.replace(' ', '%20')
-
-            if year:
-                url = f"https://api.themoviedb.org/3/search/movie?api_key={TMDB_API_KEY}&query={encoded_title}&primary_release_year={year}"
-            else:
-                url = f"https://api.themoviedb.org/3/search/movie?api_key={TMDB_API_KEY}&query={encoded_title}"
-
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        results = data.get("results", [])
-
-                        if not results and year:
-                            url_fallback = f"https://api.themoviedb.org/3/search/movie?api_key={TMDB_API_KEY}&query={encoded_title}"
-                            async with session.get(url_fallback) as resp2:
-                                if resp2.status == 200:
-                                    data2 = await resp2.json()
-                                    results = data2.get("results", [])
-
-                        if not results:
-                            url_multi = f"https://api.themoviedb.org/3/search/multi?api_key={TMDB_API_KEY}&query={encoded_title}"
-                            async with session.get(url_multi) as resp3:
-                                if resp3.status == 200:
-                                    data3 = await resp3.json()
-                                    results = data3.get("results", [])
-
-                        valid_item = None
-                        for res in results:
-                            if res.get("poster_path"):
-                                valid_item = res
-                                break
-
-                        if valid_item:
-                            title_display = valid_item.get("title") or valid_item.get("name") or search_title
-                            rel_date = valid_item.get("release_date") or valid_item.get("first_air_date") or "N/A"
-                            rating = valid_item.get("vote_average", "N/A")
-                            p_path = valid_item.get("poster_path")
-                            poster_url = f"https://image.tmdb.org/t/p/w342{p_path}"
-
-        except Exception as e:
-            logger.error(f"TMDB Fetch Error: {e}")
-            
-    caption_text = (
-        f"🎬 **EXCLUSIVE MOVIE DROP** 🎬\n\n"
-        f"📌 **TITLE :** `{title_display}`\n"
-        f"📅 **RELEASE DATE :** {rel_date}\n"
-        f"⭐ **RATING :** {rating} / 10\n"
-        f"📁 **FILE NAME :** `{raw_caption}`\n\n"
-        f"👇 **DOWNLOAD HERE** 👇\n"
-        f"Movie ka naam copy karke search group me likh dena he."
-    )
-
-    buttons = InlineKeyboardMarkup([
-        [InlineKeyboardButton("🔍 GET MOVIE HERE 🔍", url=group_link)]
-    ])
-
-    target_channel = FSUB_CHANNEL or "@Movies2026Cinema"
-    
-    async with aiohttp.ClientSession() as session:
-        img_bytes = None
-        if poster_url:
-            try:
-                async with session.get(poster_url) as resp:
-                    if resp.status == 200:
-                        img_bytes = await resp.read()
-            except Exception:
-                pass
-
-        try:
-            if img_bytes:
-                photo_file = io.BytesIO(img_bytes)
-                photo_file.name = "poster.jpg"
-                await client.send_photo(target_channel, photo=photo_file, caption=caption_text, reply_markup=buttons)
-            else:
-                await client.send_message(target_channel, text=caption_text, reply_markup=buttons)
-            
-            await status_msg.edit_text("✅ Database Updated & Channel Poster Posted!")
-        except Exception as e:
-            logger.error(f"Auto Poster Error: {e}")
-            await status_msg.edit_text(f"❌ Channel Post Error: `{e}`")
-
+    # _id pehle se, taaki job retry par doc dobara insert na ho
+    movie_doc = dict(make_movie_doc(msg, file), _id=ObjectId())
+    status = None
     try:
-        all_requests = await client.requests.find({}).to_list(length=5000)
-        for req in all_requests:
-            req_q = req.get("query", "")
-            if req_q and (req_q in search_title or fuzz.partial_ratio(req_q, search_title) > 80):
-                user_id = req.get("user_id")
-                try:
-                    await client.send_message(
-                        user_id,
-                        f"🎉 Aapki requested movie **{raw_caption}** ab hamare database me add ho gayi hai!\n\n"
-                        f"Search Group me jaakar download kar sakte hain."
-                    )
-                    await client.requests.delete_one({"_id": req["_id"]})
-                except Exception as e:
-                    logger.error(f"Failed notification to {user_id}: {e}")
+        status_msg = await msg.reply_text(f"📁 File DB queue me add ho gayi!\nClean Name: `{movie_doc['title']}`\n⏳ Checking Duplicate...")
+        status = [status_msg.chat.id, status_msg.id]
     except Exception as e:
-        logger.error(f"Request Notify Loop Error: {e}")
+        logger.error(f"Ingest Status Error: {e}")
+
+    # Durable job: ingest process (ya isi process ka ingest worker) uthayega
+    await job_queue.enqueue(client, "ingest", {"doc": movie_doc, "status": status})
 
 # ================= RUNNER =================
+metrics.gauge("bot_search_index_files", lambda: len(search_index))
+metrics.gauge("bot_pending_request_queries", lambda: len(request_index))
+metrics.gauge("bot_autodelete_backlog", lambda: app.autodelete.count_documents({}))
+metrics.gauge("bot_ingest_queue_depth", lambda: sum(q.qsize() for q in ingest_pipeline.queues.values()))
+metrics.gauge("bot_running_broadcasts", lambda: app.broadcasts.count_documents({"status": "running"}))
+metrics.gauge("bot_asyncio_tasks", lambda: len(asyncio.all_tasks()))
+metrics.gauge("bot_known_users", lambda: len(user_registry))
+metrics.gauge("bot_pending_user_writes", lambda: len(user_registry.pending))
+metrics.gauge("bot_jobs_pending", lambda: app.jobs.count_documents({"status": "pending"}))
+
+async def metrics_handler(request):
+    return web.Response(text=await metrics.render(), content_type="text/plain", headers={"X-Prometheus-Version": "0.0.4"})
+
+def query_int(request, name, default, low, high):
+    # Galat query param par 500 nahi, saaf 400
+    raw = request.query.get(name)
+    if raw is None:
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        raise web.HTTPBadRequest(text=f"{name} must be an integer\n")
+    if not low <= value <= high:
+        raise web.HTTPBadRequest(text=f"{name} must be between {low} and {high}\n")
+    return value
+
+# DEBUG_TOKEN set na ho to /debug/* band hai (404), taaki bahar se dikhe bhi nahi
+async def debug_handler(request):
+    if not debug_authorized(request):
+        raise web.HTTPNotFound()
+    view = request.match_info["view"]
+    if view == "tasks":
+        text = task_summary(top=query_int(request, "top", 30, 1, 1000))
+    elif view == "loop":
+        text = loop_monitor.summary()
+    elif view == "profile":
+        seconds = query_int(request, "seconds", 5, 1, DEBUG_PROFILE_MAX)
+        text = await run_profile(seconds, query_int(request, "top", 25, 1, 1000))
+    else:
+        raise web.HTTPNotFound()
+    return web.Response(text=text + "\n")
+
 async def start_bot():
     app_web = web.Application()
     app_web.router.add_get("/", lambda r: web.Response(text="Bot Alive"))
-    runner = web.AppRunner(app_web)
-    await runner.setup()
-    await web.TCPSite(runner, "0.0.0.0", int(os.environ.get("PORT", 8080))).start()
+    app_web.router.add_get("/metrics", metrics_handler)
+    app_web.router.add_get("/debug/{view}", debug_handler)
+    # Worker roles ko PORT na mile to web server skip (ek machine par kai processes ho sakte hain)
+    port = os.environ.get("PORT") or ("8080" if "updates" in SERVICES else "")
+    if port:
+        runner = web.AppRunner(app_web)
+        await runner.setup()
+        await web.TCPSite(runner, "0.0.0.0", int(port)).start()
     await app.start()
     await idle()
     await app.stop()